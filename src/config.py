@@ -42,6 +42,12 @@ class Settings(BaseSettings):
     ollama_llm_model: str = Field(default="llama3.2:3b")
     embedding_dimension: int = Field(default=384)
     
+    # Concurrent LLM generations sent to Ollama. Reads the same variable as
+    # the Ollama server (OLLAMA_NUM_PARALLEL: requests served at once per
+    # model); more only queue server-side. OLLAMA_MAX_LOADED_MODELS should
+    # allow the LLM and embedding model to stay loaded together.
+    ollama_num_parallel: int = Field(default=4, ge=1, le=64)
+    
     # ===========================================
     # ETL Settings
     # ===========================================
@@ -103,8 +109,13 @@ class Settings(BaseSettings):
     
     @property
     def embeddings_cache(self) -> Path:
-        """Path to embeddings JSON cache."""
-        return self.processed_path / "embeddings_cache.json"
+        """Path to the embeddings cache vectors (index alongside as .idx)."""
+        return self.processed_path / "embeddings_cache.bin"
+    
+    @property
+    def query_embeddings_cache(self) -> Path:
+        """Path to the persistent query embedding cache (SQLite)."""
+        return self.processed_path / "query_embeddings.sqlite3"
     
     # ===========================================
     # Validators
@@ -5,16 +5,22 @@ Provides connection pooling and context managers for safe usage.
 
 import asyncio
 import logging
+import struct
 from contextlib import asynccontextmanager
 from typing import Any, AsyncGenerator, Optional
 
 import asyncpg
+import numpy as np
+import orjson
 from asyncpg import Pool, Connection
 
 from src.config import settings
 
 logger = logging.getLogger(__name__)
 
+# pgvector binary header: dimension, unused (both big-endian int16)
+_VECTOR_HEADER = struct.Struct('>HH')
+
 
 class DatabaseManager:
     """
@@ -93,25 +99,47 @@ class DatabaseManager:
         Initialize each connection with custom type codecs.
         Called automatically by asyncpg for each new connection.
         """
-        # Register vector type codec for pgvector
+        # Register vector type codec for pgvector (binary wire format, so
+        # vectors never go through a text representation)
         await conn.set_type_codec(
             'vector',
             encoder=self._encode_vector,
             decoder=self._decode_vector,
             schema='public',
+            format='binary',
+        )
+        # Decode JSONB (product specs) to dicts in the driver, via orjson
+        await conn.set_type_codec(
+            'jsonb',
+            encoder=self._encode_json,
+            decoder=orjson.loads,
+            schema='pg_catalog',
             format='text',
         )
     
     @staticmethod
-    def _encode_vector(vector: list[float]) -> str:
-        """Encode Python list to PostgreSQL vector format."""
-        return f"[{','.join(str(v) for v in vector)}]"
+    def _encode_json(value: Any) -> str:
+        """Encode a value as JSON text; already-serialized strings pass through."""
+        if isinstance(value, str):
+            return value
+        return orjson.dumps(value).decode()
+    
+    @staticmethod
+    def _encode_vector(vector: Any) -> bytes:
+        """
+        Encode a vector (ndarray or list of floats) in pgvector's binary format:
+        int16 dimension, int16 unused, then big-endian float32 values.
+        """
+        values = np.asarray(vector, dtype='>f4')
+        return _VECTOR_HEADER.pack(values.shape[0], 0) + values.tobytes()
     
     @staticmethod
-    def _decode_vector(data: str) -> list[float]:
-        """Decode PostgreSQL vector to Python list."""
-        # Remove brackets and split by comma
-        return [float(x) for x in data.strip('[]').split(',')]
+    def _decode_vector(data: bytes) -> np.ndarray:
+        """Decode pgvector's binary format to a float32 ndarray."""
+        dim, _ = _VECTOR_HEADER.unpack_from(data)
+        return np.frombuffer(
+            data, dtype='>f4', count=dim, offset=_VECTOR_HEADER.size
+        ).astype(np.float32)
     
     async def close(self) -> None:
         """Close the connection pool."""
@@ -6,6 +6,7 @@ Handles table extraction with header propagation for merged cells.
 import json
 import logging
 import hashlib
+import re
 from pathlib import Path
 from typing import Any, Optional
 from dataclasses import dataclass, field, asdict
@@ -14,6 +15,10 @@ from src.config import settings
 
 logger = logging.getLogger(__name__)
 
+# ArenaMatch base models that identify a 3-level header table
+_ARENAMATCH_MODELS = ("AM10", "AM20", "AM40")
+_SHOWMATCH_MODEL_RE = re.compile(r'SM\s*\d+', re.IGNORECASE)
+
 
 @dataclass
 class ExtractedTable:
@@ -547,18 +552,18 @@ class PDFExtractor:
         if 'arenamatch' in category_hint.lower() or 'arrayable' in category_hint.lower():
             return True
         
-        # Check first row for ArenaMatch pattern
+        # Check first row for ArenaMatch pattern (scan cells, join only as a fallback)
         if raw_data:
-            first_row_text = ' '.join(str(c).lower() for c in raw_data[0] if c)
-            if 'arenamatch' in first_row_text or 'am (arena' in first_row_text:
+            first_row = [str(c).lower() for c in raw_data[0] if c]
+            if any('arenamatch' in c for c in first_row):
+                return True
+            if 'am (arena' in ' '.join(first_row):
                 return True
         
-        # Check for AM10/AM20/AM40 pattern in first 3 rows
-        import re
+        # Check for AM10/AM20/AM40 model cells in first 3 rows
         for row in raw_data[:3]:
-            row_text = ' '.join(str(c) for c in row if c)
-            if re.search(r'AM\s*\d{2}(?:/\d{2,3})?', row_text, re.IGNORECASE):
-                if any(f'AM{n}' in row_text for n in ['10', '20', '40']):
+            for cell in row:
+                if cell and any(m in str(cell) for m in _ARENAMATCH_MODELS):
                     return True
         
         return False
@@ -569,29 +574,31 @@ class PDFExtractor:
             return True
         
         if raw_data:
-            first_row_text = ' '.join(str(c).lower() for c in raw_data[0] if c)
-            if 'showmatch' in first_row_text or 'sm (showmatch)' in first_row_text:
+            if any('showmatch' in str(c).lower() for c in raw_data[0] if c):
                 return True
             
             # Check for SM5/SM10/SM20 pattern
-            import re
             for row in raw_data[:2]:
                 row_text = ' '.join(str(c) for c in row if c)
-                if re.search(r'SM\s*\d+', row_text, re.IGNORECASE):
+                if _SHOWMATCH_MODEL_RE.search(row_text):
                     return True
         
         return False
     
     def _looks_like_model_variant(self, value: str) -> bool:
         """Check if value looks like a model variant (e.g., AM10/60, AM10/80)."""
-        import re
+        value = value.strip()
+        # Every variant pattern starts with "AM" or a digit - skip the regexes otherwise
+        if not value or not (value[0].isdigit() or value[:2].upper() == 'AM'):
+            return False
+        
         patterns = [
             r'^AM\d+/\d+',           # AM10/60, AM20/80
             r'^\d+°?\s*[×x]\s*\d+',  # Coverage angles like 60° x 10°
             r'^\d+/\d+/\d+',         # Triple variants
         ]
         for pattern in patterns:
-            if re.match(pattern, value.strip(), re.IGNORECASE):
+            if re.match(pattern, value, re.IGNORECASE):
                 return True
         return False
     
@@ -7,20 +7,32 @@ import asyncio
 import hashlib
 import json
 import logging
+import mmap
+import os
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, AsyncIterable, Optional
 
-import httpx
+import numpy as np
+import orjson
 
 from src.config import settings
 from src.database import get_db, get_transaction
+from src.ollama_http import JSON_HEADERS, get_ollama_client
 
 logger = logging.getLogger(__name__)
 
+# fdatasync is not available on every platform (e.g. macOS)
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+
 
 class EmbeddingClient:
     """Client for generating embeddings via Ollama."""
     
+    # Max texts per /api/embed request
+    EMBED_BATCH_SIZE = 32
+    
     def __init__(
         self,
         base_url: Optional[str] = None,
@@ -31,45 +43,44 @@ class EmbeddingClient:
         self.base_url = (base_url or settings.ollama_base_url).rstrip('/')
         self.model = model or settings.ollama_embedding_model
         self.dimension = dimension
-        self._client: Optional[httpx.AsyncClient] = None
-    
-    async def _get_client(self) -> httpx.AsyncClient:
-        """Get or create HTTP client."""
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(
-                base_url=self.base_url,
-                timeout=httpx.Timeout(60.0),
-            )
-        return self._client
+        # Cleared if the server predates /api/embed (Ollama < 0.2)
+        self._batch_supported = True
     
     async def close(self) -> None:
-        """Close HTTP client."""
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
+        """
+        Release resources held by the client.
+        
+        Requests go through the shared Ollama client, which is closed at
+        application shutdown (see src.ollama_http), so nothing is held here.
+        """
     
-    async def generate(self, text: str) -> Optional[list[float]]:
+    async def generate(self, text: str) -> Optional[np.ndarray]:
         """Generate embedding for text."""
         if not text or not text.strip():
             return None
         
         try:
-            client = await self._get_client()
+            client = await get_ollama_client()
             
             response = await client.post(
-                "/api/embeddings",
-                json={
+                f"{self.base_url}/api/embeddings",
+                content=orjson.dumps({
                     "model": self.model,
                     "prompt": text,
-                },
+                }),
+                headers=JSON_HEADERS,
             )
             
             if response.status_code != 200:
                 logger.error(f"Embedding generation failed: {response.status_code}")
                 return None
             
-            data = response.json()
-            embedding = data.get('embedding', [])
+            data = orjson.loads(response.content)
+            embedding = data.get('embedding')
+            
+            if not embedding:
+                logger.error("Embedding response contained no vector")
+                return None
             
             if len(embedding) != self.dimension:
                 logger.warning(
@@ -77,62 +88,304 @@ class EmbeddingClient:
                     f"(expected {self.dimension})"
                 )
             
-            return embedding
+            return np.asarray(embedding, dtype=np.float32)
             
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return None
 
 
+    async def generate_batch(self, texts: list[str]) -> list[Optional[np.ndarray]]:
+        """
+        Generate embeddings for several texts in one /api/embed request.
+        
+        Falls back to one /api/embeddings request per text when the
+        server has no batch endpoint.
+        
+        Returns:
+            One embedding per text (None for failed items)
+        """
+        if not self._batch_supported:
+            return list(await asyncio.gather(*(self.generate(text) for text in texts)))
+        
+        try:
+            client = await get_ollama_client()
+            
+            response = await client.post(
+                f"{self.base_url}/api/embed",
+                content=orjson.dumps({
+                    "model": self.model,
+                    "input": texts,
+                }),
+                headers=JSON_HEADERS,
+            )
+            
+            if response.status_code == 404:
+                logger.info("Ollama has no /api/embed, falling back to per-text embeddings")
+                self._batch_supported = False
+                return await self.generate_batch(texts)
+            
+            if response.status_code != 200:
+                logger.error(f"Batch embedding generation failed: {response.status_code}")
+                return [None] * len(texts)
+            
+            data = orjson.loads(response.content)
+            embeddings = data.get('embeddings', [])
+            
+            if len(embeddings) != len(texts):
+                logger.error(
+                    f"Embedding count mismatch: {len(embeddings)} (expected {len(texts)})"
+                )
+                return [None] * len(texts)
+            
+            if embeddings and len(embeddings[0]) != self.dimension:
+                logger.warning(
+                    f"Unexpected embedding dimension: {len(embeddings[0])} "
+                    f"(expected {self.dimension})"
+                )
+            
+            return [
+                np.asarray(embedding, dtype=np.float32) if embedding else None
+                for embedding in embeddings
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error generating batch embeddings: {e}")
+            return [None] * len(texts)
+
+
 class EmbeddingCache:
-    """File-based cache for embeddings."""
+    """
+    File-based cache for embeddings.
+    
+    Vectors are appended as packed float32 rows to a .bin file that is
+    memory-mapped on load. The .idx file maps text hash -> row; keys of rows
+    appended since it was last written go to a .log file (one per line), so
+    saving and closing only append. load() compacts the log into the index
+    once it holds COMPACT_LOG_KEYS keys.
+    """
+    
+    # Bump when the key scheme or file layout changes; caches written with
+    # another version are discarded on load instead of silently missing
+    CACHE_VERSION = 3
     
-    def __init__(self, cache_path: Optional[Path] = None):
+    # set() saves once this many embeddings are pending, or once this many
+    # seconds have passed since the last save
+    SAVE_EVERY = 256
+    SAVE_INTERVAL = 10.0
+    
+    # load() rewrites the index once the log holds this many keys; below
+    # that, replaying the log is cheaper than rewriting the whole index
+    COMPACT_LOG_KEYS = 10000
+    
+    # Recent text hashes are memoized: a cache miss looks a text up with
+    # get() and then stores it with set(), which would otherwise encode and
+    # hash it twice
+    KEY_MEMO_SIZE = 1024
+    
+    def __init__(self, cache_path: Optional[Path] = None, dimension: int = 384):
         """Initialize cache."""
         self.cache_path = cache_path or settings.embeddings_cache
-        self._cache: dict[str, list[float]] = {}
+        self.index_path = self.cache_path.with_suffix('.idx')
+        self.log_path = self.cache_path.with_suffix('.log')
+        self.dimension = dimension
+        self._row_bytes = dimension * 4
+        self._index: dict[str, int] = {}
+        self._rows = 0
+        self._mmap: Optional[mmap.mmap] = None
+        # Embeddings added since the last save, not yet in the .bin file
+        self._new: dict[str, np.ndarray] = {}
+        # Whether .idx matches this cache's version, and the valid .log length
+        self._index_current = False
+        self._log_bytes = 0
+        self._last_save = time.monotonic()
         self._loaded = False
+        self._key_for = lru_cache(maxsize=self.KEY_MEMO_SIZE)(self._hash_text)
     
     def _hash_text(self, text: str) -> str:
-        """Generate hash for text."""
-        return hashlib.sha256(text.encode()).hexdigest()[:16]
+        """Generate hash for text (64-bit BLAKE2b; not a security boundary)."""
+        return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+    
+    def _map(self) -> None:
+        """Memory-map the vector file (read-only)."""
+        self._unmap()
+        if self._rows:
+            with open(self.cache_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def _unmap(self) -> None:
+        """Release the vector file mapping."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
     
     def load(self) -> None:
         """Load cache from disk."""
         if self._loaded:
             return
+        self._loaded = True
         
-        if self.cache_path.exists():
+        if not (self.index_path.exists() and self.cache_path.exists()):
+            return
+        
+        try:
+            data = orjson.loads(self.index_path.read_bytes())
+            if data.get('version') != self.CACHE_VERSION or data.get('dimension') != self.dimension:
+                logger.info("Discarding embedding cache from an older version")
+                return
+            index = data['embeddings']
+            rows = data['rows']
+            
+            # Replay keys saved since the last compaction; a torn last line
+            # (interrupted save) is ignored and overwritten by the next save
+            log = self.log_path.read_bytes() if self.log_path.exists() else b''
+            log_bytes = log.rfind(b'\n') + 1
+            log_keys = log[:log_bytes].decode().splitlines()
+            for key in log_keys:
+                index[key] = rows
+                rows += 1
+            
+            if self.cache_path.stat().st_size < rows * self._row_bytes:
+                logger.warning("Embedding cache vectors are truncated, discarding cache")
+                return
+            self._index = index
+            self._rows = rows
+            self._index_current = True
+            self._log_bytes = log_bytes
+            self._map()
+            logger.info(f"Loaded {len(self._index)} cached embeddings")
+        except Exception as e:
+            logger.warning(f"Failed to load embedding cache: {e}")
+            self._unmap()
+            self._index = {}
+            self._rows = 0
+            self._index_current = False
+            self._log_bytes = 0
+            return
+        
+        if len(log_keys) >= self.COMPACT_LOG_KEYS:
             try:
-                with open(self.cache_path, 'r') as f:
-                    self._cache = json.load(f)
-                logger.info(f"Loaded {len(self._cache)} cached embeddings")
+                self._compact()
             except Exception as e:
-                logger.warning(f"Failed to load embedding cache: {e}")
-                self._cache = {}
-        
-        self._loaded = True
+                # The next save() retries (it compacts while the index is stale)
+                logger.warning(f"Failed to compact embedding cache: {e}")
     
     def save(self) -> None:
-        """Save cache to disk."""
+        """Append new embeddings to disk and log their keys."""
+        self._last_save = time.monotonic()
+        if not self._new:
+            return
+        
         try:
-            with open(self.cache_path, 'w') as f:
-                json.dump(self._cache, f)
-            logger.debug(f"Saved {len(self._cache)} embeddings to cache")
+            self._unmap()
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_path, 'r+b' if self.cache_path.exists() else 'wb') as f:
+                # Drop rows left by a save whose keys were never recorded
+                f.truncate(self._rows * self._row_bytes)
+                f.seek(self._rows * self._row_bytes)
+                f.write(b''.join(
+                    vec.astype('<f4', copy=False).tobytes() for vec in self._new.values()
+                ))
+                # Vectors must be on disk before any key points at them
+                f.flush()
+                _fdatasync(f.fileno())
+            
+            # Rows count as saved only once their keys are recorded
+            keys = list(self._new)
+            first_row = self._rows
+            if self._index_current:
+                record = ''.join(f"{key}\n" for key in keys).encode()
+                with open(self.log_path, 'ab') as f:
+                    f.truncate(self._log_bytes)
+                    f.write(record)
+                self._log_bytes += len(record)
+            for row, key in enumerate(keys, first_row):
+                self._index[key] = row
+            self._rows = first_row + len(keys)
+            if not self._index_current:
+                try:
+                    self._compact()
+                except Exception:
+                    for key in keys:
+                        del self._index[key]
+                    self._rows = first_row
+                    raise
+            self._new.clear()
+            logger.debug(f"Saved {len(keys)} new embeddings to cache")
         except Exception as e:
             logger.warning(f"Failed to save embedding cache: {e}")
+        finally:
+            try:
+                self._map()
+            except OSError as e:
+                logger.warning(f"Failed to map embedding cache: {e}")
+    
+    def _compact(self) -> None:
+        """Rewrite the index with every key and empty the log."""
+        # Log first: if the index write then fails, the logged rows are only
+        # orphaned (and truncated later), never replayed onto a newer index
+        self._index_current = False
+        self.log_path.unlink(missing_ok=True)
+        self._log_bytes = 0
+        tmp_path = self.index_path.with_suffix('.idx.tmp')
+        tmp_path.write_bytes(orjson.dumps({
+            'version': self.CACHE_VERSION,
+            'dimension': self.dimension,
+            'rows': self._rows,
+            'embeddings': self._index,
+        }))
+        os.replace(tmp_path, self.index_path)
+        self._index_current = True
     
-    def get(self, text: str) -> Optional[list[float]]:
+    def close(self) -> None:
+        """
+        Save pending embeddings, sync the key log and release the mapping.
+        
+        Costs only what was added since the last save: the index itself is
+        rewritten by load() once the log has grown, never at shutdown.
+        """
+        self.save()
+        if self._log_bytes:
+            try:
+                with open(self.log_path, 'ab') as f:
+                    _fdatasync(f.fileno())
+            except OSError as e:
+                logger.warning(f"Failed to sync embedding cache log: {e}")
+        self._unmap()
+    
+    def get(self, text: str) -> Optional[np.ndarray]:
         """Get embedding from cache."""
         self.load()
-        text_hash = self._hash_text(text)
-        return self._cache.get(text_hash)
+        text_hash = self._key_for(text)
+        embedding = self._new.get(text_hash)
+        if embedding is not None:
+            return embedding
+        row = self._index.get(text_hash)
+        if row is None or self._mmap is None:
+            return None
+        # Copy: a view would pin the mapping, which save() has to release
+        return np.frombuffer(
+            self._mmap, dtype='<f4', count=self.dimension, offset=row * self._row_bytes
+        ).astype(np.float32)
     
-    def set(self, text: str, embedding: list[float]) -> None:
-        """Add embedding to cache."""
+    def set(self, text: str, embedding: np.ndarray) -> None:
+        """
+        Add embedding to cache (vectors of the wrong dimension are skipped).
+        
+        Saves once SAVE_EVERY embeddings are pending or SAVE_INTERVAL has
+        passed, so a crash loses at most that much work.
+        """
         self.load()
-        text_hash = self._hash_text(text)
-        self._cache[text_hash] = embedding
+        if embedding.shape != (self.dimension,):
+            return
+        text_hash = self._key_for(text)
+        if text_hash not in self._index:
+            self._new[text_hash] = embedding
+            if (
+                len(self._new) >= self.SAVE_EVERY
+                or time.monotonic() - self._last_save >= self.SAVE_INTERVAL
+            ):
+                self.save()
 
 
 class ProductLoader:
@@ -156,15 +409,18 @@ class ProductLoader:
         self.cache_embeddings = cache_embeddings if cache_embeddings is not None else settings.cache_embeddings
         
         self.embedding_client = EmbeddingClient()
-        self.embedding_cache = EmbeddingCache() if self.cache_embeddings else None
+        self.embedding_cache = (
+            EmbeddingCache(dimension=self.embedding_client.dimension)
+            if self.cache_embeddings else None
+        )
     
     async def close(self) -> None:
         """Clean up resources."""
         await self.embedding_client.close()
         if self.embedding_cache:
-            self.embedding_cache.save()
+            self.embedding_cache.close()
     
-    async def generate_embedding(self, text: str) -> Optional[list[float]]:
+    async def generate_embedding(self, text: str) -> Optional[np.ndarray]:
         """Generate embedding with caching."""
         if not text:
             return None
@@ -172,18 +428,73 @@ class ProductLoader:
         # Check cache first
         if self.embedding_cache:
             cached = self.embedding_cache.get(text)
-            if cached:
+            if cached is not None:
                 return cached
         
         # Generate new embedding
         embedding = await self.embedding_client.generate(text)
         
         # Cache the result
-        if embedding and self.embedding_cache:
+        if embedding is not None and self.embedding_cache:
             self.embedding_cache.set(text, embedding)
         
         return embedding
     
+    async def _embed_texts(
+        self,
+        texts: list[str],
+        stats: dict[str, int],
+    ) -> list[Optional[np.ndarray]]:
+        """
+        Embed a batch's texts, counting cache hits and new embeddings in stats.
+        
+        Texts are deduplicated (ignoring surrounding whitespace) before the
+        cache is checked, so repeats cost one lookup and at most one request.
+        Cache hits are served locally; the remaining distinct texts are sent
+        in sub-batches of EMBED_BATCH_SIZE, one /api/embed request each.
+        
+        Returns:
+            One embedding per text (None for empty or failed items)
+        """
+        embeddings: list[Optional[np.ndarray]] = [None] * len(texts)
+        
+        # Distinct stripped texts, with every position they fill
+        positions: dict[str, list[int]] = {}
+        for i, text in enumerate(texts):
+            text = text.strip() if text else text
+            if text:
+                positions.setdefault(text, []).append(i)
+        
+        # Texts that need a request
+        missing: dict[str, list[int]] = {}
+        for text, idxs in positions.items():
+            cached = self.embedding_cache.get(text) if self.embedding_cache else None
+            if cached is None:
+                missing[text] = idxs
+                continue
+            for i in idxs:
+                embeddings[i] = cached
+            stats["embeddings_cached"] += len(idxs)
+        
+        pending = list(missing)
+        size = self.embedding_client.EMBED_BATCH_SIZE
+        chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+        results = await asyncio.gather(
+            *(self.embedding_client.generate_batch(chunk) for chunk in chunks)
+        )
+        
+        for chunk, chunk_embeddings in zip(chunks, results, strict=True):
+            for text, embedding in zip(chunk, chunk_embeddings, strict=True):
+                if embedding is None:
+                    continue
+                if self.embedding_cache:
+                    self.embedding_cache.set(text, embedding)
+                for i in missing[text]:
+                    embeddings[i] = embedding
+                stats["embeddings_generated"] += len(missing[text])
+        
+        return embeddings
+    
     async def load(self, products: list[dict]) -> dict[str, Any]:
         """
         Load products into the database.
@@ -196,31 +507,77 @@ class ProductLoader:
         """
         logger.info(f"Loading {len(products)} products into database")
         
-        stats = {
-            "total": len(products),
+        stats = self._new_load_stats()
+        stats["total"] = len(products)
+        
+        # Process in batches
+        for i in range(0, len(products), self.batch_size):
+            batch = products[i:i + self.batch_size]
+            await self._load_batch_into(stats, batch, i // self.batch_size + 1)
+        
+        return self._finish_load(stats)
+    
+    async def load_stream(self, products: AsyncIterable[dict]) -> dict[str, Any]:
+        """
+        Load products from an async stream.
+        
+        Each batch is inserted as soon as it fills, so loading can overlap
+        with an upstream stage (e.g. synthesis) instead of waiting for it.
+        
+        Args:
+            products: Async iterable of normalized product dicts
+            
+        Returns:
+            Stats dict with counts
+        """
+        logger.info("Loading streamed products into database")
+        
+        stats = self._new_load_stats()
+        batch: list[dict] = []
+        batch_num = 0
+        
+        async for product in products:
+            stats["total"] += 1
+            batch.append(product)
+            if len(batch) >= self.batch_size:
+                batch_num += 1
+                await self._load_batch_into(stats, batch, batch_num)
+                batch = []
+        
+        if batch:
+            await self._load_batch_into(stats, batch, batch_num + 1)
+        
+        return self._finish_load(stats)
+    
+    @staticmethod
+    def _new_load_stats() -> dict[str, int]:
+        """Create an empty load stats dict."""
+        return {
+            "total": 0,
             "inserted": 0,
             "updated": 0,
             "failed": 0,
             "embeddings_generated": 0,
             "embeddings_cached": 0,
         }
+    
+    async def _load_batch_into(self, stats: dict, batch: list[dict], batch_num: int) -> None:
+        """Load one batch and add its counts to the running stats."""
+        batch_stats = await self._load_batch(batch)
         
-        # Process in batches
-        for i in range(0, len(products), self.batch_size):
-            batch = products[i:i + self.batch_size]
-            batch_stats = await self._load_batch(batch)
-            
-            stats["inserted"] += batch_stats["inserted"]
-            stats["updated"] += batch_stats["updated"]
-            stats["failed"] += batch_stats["failed"]
-            stats["embeddings_generated"] += batch_stats["embeddings_generated"]
-            stats["embeddings_cached"] += batch_stats["embeddings_cached"]
-            
-            logger.info(
-                f"Loaded batch {i//self.batch_size + 1}: "
-                f"{batch_stats['inserted']} inserted, {batch_stats['updated']} updated"
-            )
+        stats["inserted"] += batch_stats["inserted"]
+        stats["updated"] += batch_stats["updated"]
+        stats["failed"] += batch_stats["failed"]
+        stats["embeddings_generated"] += batch_stats["embeddings_generated"]
+        stats["embeddings_cached"] += batch_stats["embeddings_cached"]
         
+        logger.info(
+            f"Loaded batch {batch_num}: "
+            f"{batch_stats['inserted']} inserted, {batch_stats['updated']} updated"
+        )
+    
+    def _finish_load(self, stats: dict) -> dict:
+        """Persist the embedding cache and log the final load stats."""
         # Save embedding cache
         if self.embedding_cache:
             self.embedding_cache.save()
@@ -242,23 +599,12 @@ class ProductLoader:
             "embeddings_cached": 0,
         }
         
-        # Generate embeddings for batch
-        embedding_tasks = []
-        for product in batch:
-            # Create embedding text from raw_text or model_name + specs
-            embed_text = product.get('raw_text') or self._create_embed_text(product)
-            
-            # Check if cached
-            if self.embedding_cache and self.embedding_cache.get(embed_text):
-                stats["embeddings_cached"] += 1
-            
-            embedding_tasks.append(self.generate_embedding(embed_text))
-        
-        embeddings = await asyncio.gather(*embedding_tasks, return_exceptions=True)
-        stats["embeddings_generated"] = sum(
-            1 for e in embeddings 
-            if e is not None and not isinstance(e, Exception)
-        ) - stats["embeddings_cached"]
+        # Generate embeddings for batch, from raw_text or model_name + specs
+        embed_texts = [
+            product.get('raw_text') or self._create_embed_text(product)
+            for product in batch
+        ]
+        embeddings = await self._embed_texts(embed_texts, stats)
         
         # Insert into database
         db = await get_db()
@@ -266,9 +612,6 @@ class ProductLoader:
         async with db.transaction() as conn:
             for product, embedding in zip(batch, embeddings):
                 try:
-                    if isinstance(embedding, Exception):
-                        embedding = None
-                    
                     result = await self._upsert_product(conn, product, embedding)
                     
                     if result == "inserted":
@@ -304,7 +647,7 @@ class ProductLoader:
         self,
         conn,
         product: dict,
-        embedding: Optional[list[float]],
+        embedding: Optional[np.ndarray],
     ) -> str:
         """
         Insert or update a product.
@@ -3,19 +3,100 @@ Product Normalizer for Bose specifications.
 Handles transposed tables where columns = products, rows = specs.
 """
 
+import asyncio
 import json
 import logging
+import os
 import re
-from dataclasses import dataclass, field, asdict
+import string
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
+
+import orjson
 
 from src.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Spec values without a digit can never match a numeric unit
+_HAS_DIGIT = re.compile(r'\d')
+
+# Character sets for the exploded-model sanity check; set.isdisjoint scans
+# a short name faster than starting the regex engine twice
+_ASCII_UPPER = frozenset(string.ascii_uppercase)
+_ASCII_DIGITS = frozenset(string.digits)
+
+# Cell values that mean "no spec" for a product column
+_EMPTY_SPEC_VALUES = frozenset({"", "-"})
+
+
+# Per-cell unit parsers. Kept as plain module-level functions taking a str and
+# returning an int so the hot kernel is isolated from the normalizer class.
+def _scan_int_unit(value: str, suffixes: tuple[str, ...]) -> Optional[int]:
+    r"""
+    Return the first integer followed (after optional whitespace) by a unit.
+
+    Hand-rolled equivalent of re.search(r'(\d+)\s*(?:unit...)') for the
+    "number + unit" cells: walks digit runs directly instead of entering
+    the regex engine. `suffixes` must be lowercase.
+    """
+    n = len(value)
+    i = 0
+    while i < n:
+        if not value[i].isdecimal():
+            i += 1
+            continue
+        start = i
+        while i < n and value[i].isdecimal():
+            i += 1
+        end = i
+        while i < n and value[i].isspace():
+            i += 1
+        if value[i:i + 3].lower().startswith(suffixes):
+            return int(value[start:end])
+    return None
+
+
+def _parse_watts(value: str) -> Optional[int]:
+    """Parse the first "<int> W" value, e.g. "125 W" -> 125."""
+    if not _HAS_DIGIT.search(value):
+        return None
+    return _scan_int_unit(value, ("w",))
+
+
+def _parse_ohms(value: str) -> Optional[int]:
+    """Parse the first "<int> Ω/ohm" value, e.g. "8 Ω" -> 8."""
+    if not _HAS_DIGIT.search(value):
+        return None
+    # "Ω" (U+03A9) and the ohm sign (U+2126) both lowercase to "ω"
+    return _scan_int_unit(value, ("ω", "ohm"))
+
+
+def _looks_like_model_name(part: str) -> bool:
+    """True if part has an uppercase ASCII letter and a digit, e.g. "AM10/60"."""
+    if _ASCII_UPPER.isdisjoint(part):
+        return False
+    # Fall back to a Unicode scan so non-ASCII digits still count, as with \d
+    return not _ASCII_DIGITS.isdisjoint(part) or any(c.isdecimal() for c in part)
+
+
+# Specs appended to the raw_text summary when present
+_RAW_TEXT_KEYS = ("Power Handling (Long-term)", "Sensitivity (SPL/1W@1m)", "Driver Components")
 
-@dataclass
+
+def _create_raw_text(model_name: str, category: str, series: str, specs: dict[str, Any]) -> str:
+    """Build the pipe-separated raw_text summary used for embeddings."""
+    raw_text = f"{model_name} | {category} | {series}"
+    for key in _RAW_TEXT_KEYS:
+        if key in specs:
+            raw_text += f" | {key}: {specs[key]}"
+    return raw_text
+
+
+@dataclass(slots=True)
 class NormalizedProduct:
     """A normalized product with parsed specifications."""
     model_name: str
@@ -24,12 +105,28 @@ class NormalizedProduct:
     specs: dict[str, Any]
     pdf_source: str
     page_number: int
-    raw_text: str = ""
     watts_int: Optional[int] = None
     ohms_int: Optional[int] = None
 
+    @property
+    def raw_text(self) -> str:
+        """Summary text, built on demand so it is never held per product."""
+        return _create_raw_text(self.model_name, self.category, self.series, self.specs)
+
     def to_dict(self) -> dict:
-        return asdict(self)
+        # Flat dict instead of asdict(): no recursive deep copy of specs,
+        # which downstream stages only read
+        return {
+            "model_name": self.model_name,
+            "category": self.category,
+            "series": self.series,
+            "specs": self.specs,
+            "pdf_source": self.pdf_source,
+            "page_number": self.page_number,
+            "raw_text": self.raw_text,
+            "watts_int": self.watts_int,
+            "ohms_int": self.ohms_int,
+        }
 
     def to_db_record(self) -> dict:
         return {
@@ -41,7 +138,7 @@ class NormalizedProduct:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class NormalizationResult:
     """Result of normalization process."""
     products: list[NormalizedProduct]
@@ -78,33 +175,68 @@ class ProductNormalizer:
         "signal_processor": ["signal processor", "esp", "ex"],
     }
 
-    def __init__(self):
+    # Series detection from model names / category_hint (priority order)
+    KNOWN_SERIES = [
+        "DesignMax", "EdgeMax", "FreeSpace", "Panaray", "RoomMatch",
+        "ShowMatch", "ArenaMatch", "PowerShare", "PowerSpace",
+        "ControlCenter", "ControlSpace",
+    ]
+
+    # Below this many tables, worker start-up and pickling cost more than
+    # normalizing in-process
+    PARALLEL_MIN_TABLES = 16
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the normalizer.
+
+        Args:
+            max_workers: Worker processes for table normalization
+                (defaults to the CPU count; 1 disables the process pool)
+        """
         self.output_path = settings.processed_path / "normalized_products.json"
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Page hints repeat across tables; scan keywords once per distinct hint
+        self._category_cache: dict[str, str] = {}
+        self._hint_series_cache: dict[str, str] = {}
+        # (lowercase, original) pairs so per-product series matching never re-cases them
+        self._series_lower = [(s.lower(), s) for s in self.KNOWN_SERIES]
 
     async def normalize(self, extraction_results: list[dict]) -> NormalizationResult:
         """
         Normalize extraction results. Each result has pdf_source and tables.
         Tables are transposed: columns = products, rows = specs.
         """
-        logger.info(f"Normalizing {len(extraction_results)} extraction results")
+        logger.info("Normalizing %d extraction results", len(extraction_results))
 
         all_products: list[NormalizedProduct] = []
         all_errors: list[str] = []
         models_exploded = 0
 
-        for ext_result in extraction_results:
-            pdf_source = ext_result.get("pdf_source", "unknown")
-            tables = ext_result.get("tables", [])
+        jobs = list(self._iter_tables(extraction_results))
+        tables_processed = len(jobs)
+        for _, table in jobs:
+            self._prep_table(table)
 
-            for table in tables:
+        if self.max_workers > 1 and tables_processed >= self.PARALLEL_MIN_TABLES:
+            outcomes = await self._normalize_tables_parallel(jobs)
+        else:
+            outcomes = []
+            for pdf_source, table in jobs:
                 try:
-                    products, exploded = self._normalize_table(table, pdf_source)
-                    all_products.extend(products)
-                    models_exploded += exploded
+                    outcomes.append(self._normalize_table(table, pdf_source))
                 except Exception as e:
-                    err = f"Error normalizing table from {pdf_source} p{table.get('page_number', '?')}: {e}"
-                    logger.error(err)
-                    all_errors.append(err)
+                    outcomes.append(e)
+
+        for (pdf_source, table), outcome in zip(jobs, outcomes, strict=True):
+            if isinstance(outcome, BaseException):
+                err = f"Error normalizing table from {pdf_source} p{table.get('page_number', '?')}: {outcome}"
+                logger.error(err)
+                all_errors.append(err)
+                continue
+            products, exploded = outcome
+            all_products.extend(products)
+            models_exploded += exploded
 
         # Save output
         self._save_output(all_products)
@@ -115,17 +247,69 @@ class ProductNormalizer:
             stats={
                 "total_products": len(all_products),
                 "rows_exploded": models_exploded,
-                "tables_processed": sum(len(r.get("tables", [])) for r in extraction_results),
+                "tables_processed": tables_processed,
             },
         )
 
         logger.info(
-            f"Normalization complete: {len(all_products)} products "
-            f"from {result.stats['tables_processed']} tables "
-            f"({models_exploded} exploded)"
+            "Normalization complete: %d products from %d tables (%d exploded)",
+            len(all_products), result.stats["tables_processed"], models_exploded,
         )
         return result
 
+    async def _normalize_tables_parallel(
+        self, jobs: list[tuple[str, dict]]
+    ) -> list[Any]:
+        """
+        Normalize independent tables across a process pool.
+
+        Returns one (products, exploded_count) tuple or exception per job,
+        in job order.
+        """
+        loop = asyncio.get_running_loop()
+        workers = min(self.max_workers, len(jobs))
+        logger.info("Normalizing %d tables across %d processes", len(jobs), workers)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tasks = [
+                loop.run_in_executor(pool, self._normalize_table, table, pdf_source)
+                for pdf_source, table in jobs
+            ]
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Unpickling gives every table its own copies of the categorical
+        # strings; intern them so all products share one object per value
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                continue
+            for product in outcome[0]:
+                product.category = sys.intern(product.category)
+                product.series = sys.intern(product.series)
+                product.pdf_source = sys.intern(product.pdf_source)
+        return outcomes
+
+    @staticmethod
+    def _iter_tables(extraction_results: list[dict]) -> Iterator[tuple[str, dict]]:
+        """Stream (pdf_source, table) pairs across all extraction results."""
+        for ext_result in extraction_results:
+            pdf_source = ext_result.get("pdf_source", "unknown")
+            for table in ext_result.get("tables", []):
+                yield pdf_source, table
+
+    def _prep_table(self, table: dict) -> None:
+        """
+        Attach the hint-derived category and fallback series to a table.
+
+        Runs in the parent before any dispatch, so each distinct hint is
+        resolved once through the memo caches and worker processes never
+        repeat the keyword scans. Values set upstream are kept.
+        """
+        category_hint = table.get("category_hint", "")
+        if not table.get("category"):
+            table["category"] = self._detect_category(category_hint)
+        if not table.get("series_fallback"):
+            table["series_fallback"] = self._detect_series_from_hint(category_hint)
+
     def _normalize_table(
         self, table: dict, pdf_source: str
     ) -> tuple[list[NormalizedProduct], int]:
@@ -158,8 +342,42 @@ class ProductNormalizer:
                 if raw_idx < len(raw_header_row) and raw_header_row[raw_idx]:
                     clean_names[col] = raw_header_row[raw_idx]
 
-        # Detect category from the category_hint
-        category = self._detect_category(category_hint)
+        # Category and fallback series from the category_hint, usually
+        # pre-detected by _prep_table
+        category = table.get("category") or self._detect_category(category_hint)
+        series_fallback = (
+            table.get("series_fallback") or self._detect_series_from_hint(category_hint)
+        )
+
+        # Spec labels are shared by every product column: intern them once per
+        # table so all specs dicts reference a single string per label
+        labeled_rows = [
+            (sys.intern(str(row[label_key])), row) for row in rows if row.get(label_key)
+        ]
+
+        # Classify spec labels once per table instead of lowercasing and
+        # substring-testing every product's specs keys
+        labels = {label for label, _ in labeled_rows}
+        power_labels = frozenset(
+            label for label in labels
+            if "power" in label.lower() or "watt" in label.lower()
+        )
+        impedance_labels = frozenset(label for label in labels if "impedance" in label.lower())
+
+        # Build every column's specs dict in one pass over the rows:
+        # key=row's label, value=row's column value
+        specs_by_col: dict[str, dict[str, Any]] = {col: {} for col in product_columns}
+        for spec_name, row in labeled_rows:
+            for col in product_columns:
+                spec_value = row.get(col)
+                if not spec_value:
+                    continue
+                if isinstance(spec_value, str):
+                    spec_value = spec_value.strip()
+                else:
+                    spec_value = str(spec_value).strip()
+                if spec_value not in _EMPTY_SPEC_VALUES:
+                    specs_by_col[col][spec_name] = spec_value
 
         products: list[NormalizedProduct] = []
         exploded = 0
@@ -168,46 +386,33 @@ class ProductNormalizer:
             model_name = clean_names.get(col, col)
 
             # Detect series per-product from model name, fallback to hint
-            series = self._detect_series(category_hint, model_name)
-
-            # Build specs dict: iterate all rows, key=row's label, value=row's column value
-            specs: dict[str, Any] = {}
-            for row in rows:
-                spec_name = row.get(label_key, "")
-                spec_value = row.get(col, "")
-                if spec_name and spec_value and str(spec_value).strip() not in ("", "-"):
-                    specs[spec_name] = str(spec_value).strip()
+            series = self._detect_series_from_model(model_name, series_fallback)
 
+            specs = specs_by_col[col]
             if not specs:
                 continue
 
             # Extract watts_int and ohms_int
-            watts_int = self._extract_watts(specs)
-            ohms_int = self._extract_ohms(specs)
-
-            # Build raw_text summary
-            raw_text = f"{model_name} | {category} | {series}"
-            for key in ["Power Handling (Long-term)", "Sensitivity (SPL/1W@1m)", "Driver Components"]:
-                if key in specs:
-                    raw_text += f" | {key}: {specs[key]}"
+            watts_int, ohms_int = self._extract_numeric(specs, power_labels, impedance_labels)
 
             # Explode slash-separated model names
             model_names = self._explode_model(model_name)
             if len(model_names) > 1:
                 exploded += len(model_names) - 1
 
-            for name in model_names:
-                products.append(NormalizedProduct(
+            products.extend(
+                NormalizedProduct(
                     model_name=name.strip(),
                     category=category,
                     series=series,
                     specs=specs,
                     pdf_source=pdf_source,
                     page_number=page_number,
-                    raw_text=raw_text,
                     watts_int=watts_int,
                     ohms_int=ohms_int,
-                ))
+                )
+                for name in model_names
+            )
 
         return products, exploded
 
@@ -222,67 +427,75 @@ class ProductNormalizer:
         if " / " in model_name:
             parts = [p.strip() for p in model_name.split(" / ")]
             # Sanity check: each part should look like a model name (has letters + numbers)
-            if all(re.search(r'[A-Z]', p) and re.search(r'\d', p) for p in parts):
+            if all(_looks_like_model_name(p) for p in parts):
                 return parts
         return [model_name]
 
-    def _extract_watts(self, specs: dict) -> Optional[int]:
-        """Extract integer watts from Power Handling spec."""
-        for key in specs:
-            if "power" in key.lower() or "watt" in key.lower():
-                match = re.search(r'(\d+)\s*[Ww]', specs[key])
-                if match:
-                    return int(match.group(1))
-        return None
+    def _extract_numeric(
+        self,
+        specs: dict,
+        power_labels: frozenset[str],
+        impedance_labels: frozenset[str],
+    ) -> tuple[Optional[int], Optional[int]]:
+        """
+        Extract integer watts and ohms in a single pass over the specs.
 
-    def _extract_ohms(self, specs: dict) -> Optional[int]:
-        """Extract integer ohms from Nominal Impedance spec."""
-        for key in specs:
-            if "impedance" in key.lower():
-                match = re.search(r'(\d+)\s*(?:Ω|Ω|ohm)', specs[key], re.IGNORECASE)
-                if match:
-                    return int(match.group(1))
-        return None
+        Returns (watts_int, ohms_int), each taken from the first parseable
+        Power Handling / Nominal Impedance spec respectively.
+        """
+        watts: Optional[int] = None
+        ohms: Optional[int] = None
+        for key, value in specs.items():
+            if watts is None and key in power_labels:
+                watts = _parse_watts(value)
+            if ohms is None and key in impedance_labels:
+                ohms = _parse_ohms(value)
+            if watts is not None and ohms is not None:
+                break
+        return watts, ohms
 
     def _detect_category(self, category_hint: str) -> str:
         """Detect product category from the page category hint."""
-        hint_lower = category_hint.lower()
-        for category, keywords in self.CATEGORY_MAP.items():
-            if any(kw in hint_lower for kw in keywords):
-                return category
-        return "loudspeaker"  # default
-
-    def _detect_series(self, category_hint: str, model_name: str = "") -> str:
-        """Detect product series from category hint or a specific model name."""
-        known_series = [
-            "DesignMax", "EdgeMax", "FreeSpace", "Panaray", "RoomMatch",
-            "ShowMatch", "ArenaMatch", "PowerShare", "PowerSpace",
-            "ControlCenter", "ControlSpace",
-        ]
-
-        # Try from the model name first (most specific)
+        category = self._category_cache.get(category_hint)
+        if category is None:
+            category = "loudspeaker"  # default
+            hint_lower = category_hint.lower()
+            for candidate, keywords in self.CATEGORY_MAP.items():
+                if any(kw in hint_lower for kw in keywords):
+                    category = candidate
+                    break
+            self._category_cache[category_hint] = category
+        return category
+
+    def _detect_series_from_hint(self, category_hint: str) -> str:
+        """Detect product series from a table's category hint."""
+        series = self._hint_series_cache.get(category_hint)
+        if series is None:
+            series = "Unknown"
+            hint_upper = category_hint.upper()
+            for s in self.KNOWN_SERIES:
+                if s.upper() in hint_upper:
+                    series = s
+                    break
+            self._hint_series_cache[category_hint] = series
+        return series
+
+    def _detect_series_from_model(self, model_name: str, fallback: str) -> str:
+        """Detect product series from a model name, else return the table's fallback."""
+        # The model name is the most specific source. This also covers
+        # "Series.Model" names, whose prefix is a substring of the name.
         if model_name:
-            for s in known_series:
-                if s.lower() in model_name.lower():
-                    return s
-            if "." in model_name:
-                prefix = model_name.split(".")[0]
-                for s in known_series:
-                    if s.lower() == prefix.lower():
-                        return s
-
-        # Try from category_hint
-        hint_upper = category_hint.upper()
-        for s in known_series:
-            if s.upper() in hint_upper:
-                return s
-
-        return "Unknown"
+            model_lower = model_name.lower()
+            for series_lower, series in self._series_lower:
+                if series_lower in model_lower:
+                    return series
+        return fallback
 
     def _save_output(self, products: list[NormalizedProduct]) -> None:
         """Save normalized products to JSON file."""
+        # to_dict() rather than orjson's native dataclass support so the
+        # computed raw_text property is included
         output = {"products": [p.to_dict() for p in products]}
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.output_path, "w", encoding="utf-8") as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
-        logger.info(f"Saved normalized products to: {self.output_path}")
+        self.output_path.write_bytes(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+        logger.info("Saved normalized products to: %s", self.output_path)
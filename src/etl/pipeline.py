@@ -11,14 +11,15 @@ import time
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional, Union
 
 from src.config import settings
-from src.database import get_db
+from src.database import DatabaseManager, get_db
 from src.etl.extractor import PDFExtractor, ExtractionResult
-from src.etl.normalizer import ProductNormalizer, NormalizationResult
+from src.etl.normalizer import NormalizationResult, NormalizedProduct, ProductNormalizer
 from src.etl.synthesizer import OllamaSynthesizer
 from src.etl.loader import ProductLoader
+from src.ollama_http import close_ollama_client
 
 logger = logging.getLogger(__name__)
 
@@ -32,8 +33,14 @@ class ETLPipeline:
     2. Normalize: Explode model ranges, parse units
     3. Synthesize: Generate AI summaries (optional)
     4. Load: Insert into PostgreSQL with embeddings
+    
+    Stages 3 and 4 overlap: products are loaded in batches while the
+    remaining summaries are still being generated.
     """
     
+    # Max products buffered between overlapping stages (backpressure)
+    STAGE_QUEUE_SIZE = 32
+    
     def __init__(
         self,
         pdf_dir: Optional[Path] = None,
@@ -58,6 +65,8 @@ class ETLPipeline:
         self.job_id = str(uuid.uuid4())
         self.start_time: Optional[float] = None
         self.stats: dict[str, Any] = {}
+        self._start_log_task: Optional[asyncio.Task] = None
+        self._db: Optional[DatabaseManager] = None
     
     async def run(self) -> dict[str, Any]:
         """
@@ -68,8 +77,8 @@ class ETLPipeline:
         """
         self.start_time = time.time()
         
-        logger.info(f"Starting ETL pipeline - Job ID: {self.job_id}")
-        logger.info(f"PDF directory: {self.pdf_dir}")
+        logger.info("Starting ETL pipeline - Job ID: %s", self.job_id)
+        logger.info("PDF directory: %s", self.pdf_dir)
         
         # Initialize stats
         self.stats = {
@@ -82,8 +91,8 @@ class ETLPipeline:
         }
         
         try:
-            # Log job start to database
-            await self._log_job_start()
+            # Log job start in the background; only the closing UPDATE waits on it
+            self._start_log_task = asyncio.create_task(self._log_job_start())
             
             # Stage 1: Extract
             extraction_results = await self._run_extraction()
@@ -91,13 +100,13 @@ class ETLPipeline:
             # Stage 2: Normalize
             normalization_result = await self._run_normalization(extraction_results)
             
-            # Stage 3: Synthesize (optional)
-            products = [p.to_dict() for p in normalization_result.products]
-            if not self.skip_synthesis:
-                products = await self._run_synthesis(products)
-            
-            # Stage 4: Load
-            load_stats = await self._run_loading(products)
+            # Stages 3+4: Synthesize (optional), overlapped with Load.
+            # Product dicts are built on demand as the stages consume them.
+            products = normalization_result.products
+            if self.skip_synthesis:
+                load_stats = await self._run_loading(self._product_dicts(products))
+            else:
+                load_stats = await self._run_synthesis_and_loading(products)
             
             # Create vector index
             if self.create_vector_index:
@@ -109,7 +118,7 @@ class ETLPipeline:
             self.stats["status"] = "completed"
             self.stats["completed_at"] = datetime.now().isoformat()
             
-            logger.info(f"ETL pipeline completed in {elapsed:.2f}s")
+            logger.info("ETL pipeline completed in %.2fs", elapsed)
             
             # Log job completion
             await self._log_job_complete(load_stats)
@@ -117,7 +126,7 @@ class ETLPipeline:
             return self.stats
             
         except Exception as e:
-            logger.error(f"ETL pipeline failed: {e}", exc_info=True)
+            logger.error("ETL pipeline failed: %s", e, exc_info=True)
             self.stats["status"] = "failed"
             self.stats["errors"].append(str(e))
             
@@ -154,9 +163,8 @@ class ETLPipeline:
         }
         
         logger.info(
-            f"Extraction complete: {len(results)} PDFs, "
-            f"{self.stats['stages']['extraction']['tables_extracted']} tables "
-            f"in {elapsed:.2f}s"
+            "Extraction complete: %d PDFs, %d tables in %.2fs",
+            len(results), self.stats["stages"]["extraction"]["tables_extracted"], elapsed,
         )
         
         return extraction_dicts
@@ -178,17 +186,21 @@ class ETLPipeline:
         }
         
         logger.info(
-            f"Normalization complete: {len(result.products)} products "
-            f"({result.stats.get('rows_exploded', 0)} exploded) "
-            f"in {elapsed:.2f}s"
+            "Normalization complete: %d products (%d exploded) in %.2fs",
+            len(result.products), result.stats.get("rows_exploded", 0), elapsed,
         )
         
         return result
     
-    async def _run_synthesis(self, products: list[dict]) -> list[dict]:
-        """Run the synthesis stage."""
-        logger.info("Stage 3: Synthesis")
-        stage_start = time.time()
+    async def _run_synthesis_and_loading(self, products: list[NormalizedProduct]) -> dict:
+        """
+        Run synthesis and loading as overlapping stages.
+        
+        Summarized products flow through a bounded queue, so the loader
+        embeds and inserts each batch while the LLM is still summarizing the
+        rest. The bound applies backpressure if loading falls behind.
+        """
+        logger.info("Stage 3: Synthesis (overlapped with loading)")
         
         async with OllamaSynthesizer() as synthesizer:
             # Check if Ollama is available
@@ -199,13 +211,46 @@ class ETLPipeline:
                     "skipped": True,
                     "reason": "Ollama not available",
                 }
-                return products
+                return await self._run_loading(self._product_dicts(products))
             
-            result = await synthesizer.synthesize_batch(products)
+            queue: asyncio.Queue[Optional[dict]] = asyncio.Queue(maxsize=self.STAGE_QUEUE_SIZE)
+            producer = asyncio.create_task(
+                self._synthesis_worker(synthesizer, products, queue)
+            )
+            
+            try:
+                load_stats = await self._run_loading(self._drain_queue(queue))
+            except BaseException:
+                producer.cancel()
+                raise
+            
+            # Surface synthesis errors after the loader has drained the queue
+            await producer
         
-        elapsed = time.time() - stage_start
-        summaries_generated = sum(1 for p in result if p.get('ai_summary'))
+        return load_stats
+    
+    async def _synthesis_worker(
+        self,
+        synthesizer: OllamaSynthesizer,
+        products: list[NormalizedProduct],
+        queue: asyncio.Queue,
+    ) -> None:
+        """Summarize products and feed them to the load stage; None marks the end."""
+        stage_start = time.time()
+        summaries_generated = 0
         
+        try:
+            product_dicts = (p.to_dict() for p in products)
+            async for product in synthesizer.synthesize_stream(product_dicts):
+                if product.get('ai_summary'):
+                    summaries_generated += 1
+                await queue.put(product)
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+        
+        elapsed = time.time() - stage_start
         self.stats["stages"]["synthesis"] = {
             "elapsed_seconds": round(elapsed, 2),
             "summaries_generated": summaries_generated,
@@ -213,19 +258,32 @@ class ETLPipeline:
         }
         
         logger.info(
-            f"Synthesis complete: {summaries_generated}/{len(products)} summaries "
-            f"in {elapsed:.2f}s"
+            "Synthesis complete: %d/%d summaries in %.2fs",
+            summaries_generated, len(products), elapsed,
         )
-        
-        return result
     
-    async def _run_loading(self, products: list[dict]) -> dict:
-        """Run the loading stage."""
+    @staticmethod
+    async def _product_dicts(products: list[NormalizedProduct]) -> AsyncIterator[dict]:
+        """Yield each normalized product as a dict, converting on demand."""
+        for product in products:
+            yield product.to_dict()
+    
+    @staticmethod
+    async def _drain_queue(queue: asyncio.Queue) -> AsyncIterator[dict]:
+        """Yield items from a stage queue until the None sentinel."""
+        while (item := await queue.get()) is not None:
+            yield item
+    
+    async def _run_loading(self, products: Union[list[dict], AsyncIterator[dict]]) -> dict:
+        """Run the loading stage from a product list or an upstream stream."""
         logger.info("Stage 4: Loading")
         stage_start = time.time()
         
         async with ProductLoader() as loader:
-            load_stats = await loader.load(products)
+            if isinstance(products, list):
+                load_stats = await loader.load(products)
+            else:
+                load_stats = await loader.load_stream(products)
         
         elapsed = time.time() - stage_start
         self.stats["stages"]["loading"] = {
@@ -234,10 +292,9 @@ class ETLPipeline:
         }
         
         logger.info(
-            f"Loading complete: {load_stats['inserted']} inserted, "
-            f"{load_stats['updated']} updated, "
-            f"{load_stats['embeddings_generated']} embeddings generated "
-            f"in {elapsed:.2f}s"
+            "Loading complete: %d inserted, %d updated, %d embeddings generated in %.2fs",
+            load_stats["inserted"], load_stats["updated"],
+            load_stats["embeddings_generated"], elapsed,
         )
         
         return load_stats
@@ -251,25 +308,39 @@ class ETLPipeline:
         
         self.stats["vector_index_created"] = success
     
+    async def _job_db(self) -> DatabaseManager:
+        """Resolve the database handle once and reuse it for all job log writes."""
+        if self._db is None:
+            self._db = await get_db()
+        return self._db
+    
     async def _log_job_start(self) -> None:
         """Log job start to database."""
         try:
-            db = await get_db()
+            db = await self._job_db()
             await db.execute(
                 """
-                INSERT INTO etl_jobs (job_id, status, pdf_source)
-                VALUES ($1, 'running', $2)
+                INSERT INTO etl_jobs (job_id, status, pdf_source, started_at)
+                VALUES ($1, 'running', $2, to_timestamp($3))
                 """,
                 uuid.UUID(self.job_id),
                 str(self.pdf_dir),
+                self.start_time,
             )
         except Exception as e:
-            logger.warning(f"Failed to log job start: {e}")
+            logger.warning("Failed to log job start: %s", e)
+    
+    async def _await_job_start(self) -> None:
+        """Wait for the background start row so the closing UPDATE can find it."""
+        if self._start_log_task is not None:
+            await self._start_log_task
+            self._start_log_task = None
     
     async def _log_job_complete(self, load_stats: dict) -> None:
         """Log job completion to database."""
+        await self._await_job_start()
         try:
-            db = await get_db()
+            db = await self._job_db()
             await db.execute(
                 """
                 UPDATE etl_jobs SET
@@ -284,12 +355,13 @@ class ETLPipeline:
                 load_stats.get("inserted", 0) + load_stats.get("updated", 0),
             )
         except Exception as e:
-            logger.warning(f"Failed to log job completion: {e}")
+            logger.warning("Failed to log job completion: %s", e)
     
     async def _log_job_failed(self, error: str) -> None:
         """Log job failure to database."""
+        await self._await_job_start()
         try:
-            db = await get_db()
+            db = await self._job_db()
             await db.execute(
                 """
                 UPDATE etl_jobs SET
@@ -302,7 +374,7 @@ class ETLPipeline:
                 json.dumps([error]),
             )
         except Exception as e:
-            logger.warning(f"Failed to log job failure: {e}")
+            logger.warning("Failed to log job failure: %s", e)
 
 
 async def main():
@@ -390,6 +462,9 @@ async def main():
     except Exception as e:
         print(f"\nETL Pipeline failed: {e}", file=sys.stderr)
         return 1
+    
+    finally:
+        await close_ollama_client()
 
 
 if __name__ == "__main__":
@@ -5,14 +5,38 @@ Uses local Ollama LLM for zero-hallucination summarization.
 
 import asyncio
 import logging
-from typing import Any, Optional
+from contextlib import aclosing
+from itertools import islice
+from typing import Any, AsyncIterator, Iterable, Optional
 
 import httpx
+import orjson
 
 from src.config import settings
+from src.ollama_http import JSON_HEADERS, get_ollama_client
 
 logger = logging.getLogger(__name__)
 
+# Priority specs to include in the prompt: (key, label, unit)
+_PRIORITY_SPECS = (
+    ('power_watts', 'Power', 'W'),
+    ('freq_min_hz', 'Frequency Min', 'Hz'),
+    ('freq_max_hz', 'Frequency Max', 'Hz'),
+    ('impedance_ohms', 'Impedance', 'ohms'),
+    ('sensitivity_db', 'Sensitivity', 'dB'),
+    ('coverage', 'Coverage', ''),
+    ('driver_components', 'Drivers', ''),
+    ('voltage_type', 'Voltage Type', ''),
+    ('environmental', 'Environmental', ''),
+    ('color_options', 'Colors', ''),
+)
+
+# (key, line template) pairs with label and unit already baked in
+_SPEC_FORMATTERS = tuple(
+    (key, f"- {label}: {{}} {unit}" if unit else f"- {label}: {{}}")
+    for key, label, unit in _PRIORITY_SPECS
+)
+
 
 class OllamaSynthesizer:
     """
@@ -22,14 +46,18 @@ class OllamaSynthesizer:
     semantic search without hallucinating specifications.
     """
     
-    SUMMARIZATION_PROMPT = """You are a technical writer summarizing Bose professional audio equipment.
+    # Static instructions go in the system prompt, which the chat template
+    # places first, and product fields in the per-request prompt. Every
+    # request then shares the same token prefix and Ollama reuses its cached
+    # prefill for it. Keep the system prompt byte-identical across calls.
+    SYSTEM_PROMPT = """You are a technical writer summarizing Bose professional audio equipment.
 Given the following product specifications, write a concise 2-3 sentence summary.
 Focus on: what the product is, its key use cases, and standout features.
 Do NOT make up any specifications that aren't provided.
 Do NOT include marketing fluff.
-Be factual and technical.
+Be factual and technical."""
 
-Product: {model_name}
+    SUMMARIZATION_PROMPT = """Product: {model_name}
 Category: {category}
 Series: {series}
 
@@ -38,6 +66,9 @@ Specifications:
 
 Summary:"""
 
+    # Keep the model resident (with its prompt cache) between requests
+    KEEP_ALIVE = "30m"
+
     def __init__(
         self,
         base_url: Optional[str] = None,
@@ -48,34 +79,40 @@ Summary:"""
         self.base_url = (base_url or settings.ollama_base_url).rstrip('/')
         self.model = model or settings.ollama_llm_model
         self.timeout = timeout
-        self._client: Optional[httpx.AsyncClient] = None
-    
-    async def _get_client(self) -> httpx.AsyncClient:
-        """Get or create HTTP client."""
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(
-                base_url=self.base_url,
-                timeout=httpx.Timeout(self.timeout),
-            )
-        return self._client
+        
+        # Fixed per instance; generate_summary only adds the prompt
+        self._tags_url = f"{self.base_url}/api/tags"
+        self._generate_url = f"{self.base_url}/api/generate"
+        self._generate_payload = {
+            "model": self.model,
+            "system": self.SYSTEM_PROMPT,
+            "stream": True,
+            "keep_alive": self.KEEP_ALIVE,
+            "options": {
+                "temperature": 0.3,  # Lower temperature for factual output
+                "num_predict": 150,  # Limit response length
+            },
+        }
     
     async def close(self) -> None:
-        """Close the HTTP client."""
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
+        """
+        Release resources held by the synthesizer.
+        
+        Requests go through the shared Ollama client, which is closed at
+        application shutdown (see src.ollama_http), so nothing is held here.
+        """
     
     async def health_check(self) -> bool:
         """Check if Ollama is available and model is loaded."""
         try:
-            client = await self._get_client()
-            response = await client.get("/api/tags")
+            client = await get_ollama_client()
+            response = await client.get(self._tags_url, timeout=self.timeout)
             
             if response.status_code != 200:
-                logger.error(f"Ollama health check failed: {response.status_code}")
+                logger.error("Ollama health check failed: %s", response.status_code)
                 return False
             
-            data = response.json()
+            data = orjson.loads(response.content)
             models = [m['name'] for m in data.get('models', [])]
             
             # Check if our model is available (with or without version tag)
@@ -86,16 +123,16 @@ Summary:"""
             
             if not model_available:
                 logger.warning(
-                    f"Model {self.model} not found. Available: {models}. "
-                    f"Run: ollama pull {self.model}"
+                    "Model %s not found. Available: %s. Run: ollama pull %s",
+                    self.model, models, self.model,
                 )
                 return False
             
-            logger.info(f"Ollama health check passed. Model: {self.model}")
+            logger.info("Ollama health check passed. Model: %s", self.model)
             return True
             
         except Exception as e:
-            logger.error(f"Ollama health check failed: {e}")
+            logger.error("Ollama health check failed: %s", e)
             return False
     
     async def generate_summary(
@@ -128,93 +165,81 @@ Summary:"""
         )
         
         try:
-            client = await self._get_client()
-            
-            response = await client.post(
-                "/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,  # Lower temperature for factual output
-                        "num_predict": 150,  # Limit response length
-                    },
-                },
-            )
+            client = await get_ollama_client()
             
-            if response.status_code != 200:
-                logger.error(f"Ollama generate failed: {response.status_code}")
-                return None
+            # Stream the generation and stop at the first paragraph break:
+            # the summary is a single paragraph, so anything after it is the
+            # model running on toward num_predict. Leaving the stream early
+            # drops the connection, which also stops generation server-side.
+            parts: list[str] = []
+            async with client.stream(
+                "POST",
+                self._generate_url,
+                timeout=self.timeout,
+                content=orjson.dumps({**self._generate_payload, "prompt": prompt}),
+                headers=JSON_HEADERS,
+            ) as response:
+                if response.status_code != 200:
+                    logger.error("Ollama generate failed: %s", response.status_code)
+                    return None
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = orjson.loads(line)
+                    if 'error' in chunk:
+                        logger.error("Ollama generate failed: %s", chunk['error'])
+                        return None
+                    piece = chunk.get('response', '')
+                    parts.append(piece)
+                    if chunk.get('done'):
+                        break
+                    # Only a chunk with a newline can complete a break
+                    if '\n' in piece and '\n\n' in ''.join(parts).strip():
+                        break
             
-            data = response.json()
-            summary = data.get('response', '').strip()
+            summary = ''.join(parts).strip().partition('\n\n')[0].rstrip()
             
             # Clean up the summary
             summary = self._clean_summary(summary)
             
-            logger.debug(f"Generated summary for {model_name}: {summary[:50]}...")
+            logger.debug("Generated summary for %s: %.50s...", model_name, summary)
             return summary
             
         except httpx.TimeoutException:
-            logger.warning(f"Timeout generating summary for {model_name}")
+            logger.warning("Timeout generating summary for %s", model_name)
             return None
         except Exception as e:
-            logger.error(f"Error generating summary for {model_name}: {e}")
+            logger.error("Error generating summary for %s: %s", model_name, e)
             return None
     
     def _format_specs(self, specs: dict[str, Any]) -> str:
         """Format specifications for the prompt."""
-        lines = []
-        
-        # Priority specs to include
-        priority_keys = [
-            ('power_watts', 'Power', 'W'),
-            ('freq_min_hz', 'Frequency Min', 'Hz'),
-            ('freq_max_hz', 'Frequency Max', 'Hz'),
-            ('impedance_ohms', 'Impedance', 'ohms'),
-            ('sensitivity_db', 'Sensitivity', 'dB'),
-            ('coverage', 'Coverage', ''),
-            ('driver_components', 'Drivers', ''),
-            ('voltage_type', 'Voltage Type', ''),
-            ('environmental', 'Environmental', ''),
-            ('color_options', 'Colors', ''),
-        ]
-        
-        for key, label, unit in priority_keys:
-            value = specs.get(key)
-            if value:
-                if unit:
-                    lines.append(f"- {label}: {value} {unit}")
-                else:
-                    lines.append(f"- {label}: {value}")
-        
-        return '\n'.join(lines) if lines else 'No specifications available'
+        specs_text = '\n'.join(
+            fmt.format(value) for key, fmt in _SPEC_FORMATTERS if (value := specs.get(key))
+        )
+        return specs_text or 'No specifications available'
     
     def _clean_summary(self, summary: str) -> str:
         """Clean and validate the generated summary."""
         # Remove any leading/trailing quotes
         summary = summary.strip('"\'')
         
-        # Remove "Summary:" prefix if present
-        if summary.lower().startswith('summary:'):
+        # Remove "Summary:" prefix if present (lowercase only the prefix)
+        if summary[:8].lower() == 'summary:':
             summary = summary[8:].strip()
         
-        # Limit to reasonable length
+        # Limit to reasonable length, cutting after the last complete sentence
         if len(summary) > 500:
-            # Find last complete sentence
-            sentences = summary[:500].split('.')
-            if len(sentences) > 1:
-                summary = '.'.join(sentences[:-1]) + '.'
-            else:
-                summary = summary[:500] + '...'
+            cut = summary.rfind('.', 0, 500)
+            summary = summary[:cut + 1] if cut >= 0 else summary[:500] + '...'
         
         return summary
     
     async def synthesize_batch(
         self,
         products: list[dict],
-        concurrency: int = 3,
+        concurrency: int = 8,
     ) -> list[dict]:
         """
         Generate summaries for a batch of products.
@@ -224,48 +249,107 @@ Summary:"""
             concurrency: Max concurrent requests
             
         Returns:
-            List of products with ai_summary added
+            List of products with ai_summary added, in input order
         """
-        logger.info(f"Synthesizing summaries for {len(products)} products")
+        logger.info("Synthesizing summaries for %d products", len(products))
         
         # Check Ollama availability
         if not await self.health_check():
             logger.warning("Ollama not available, skipping synthesis")
             return products
         
-        semaphore = asyncio.Semaphore(concurrency)
+        final_results: list[Optional[dict]] = [None] * len(products)
+        async with aclosing(self._summarize_window(products, concurrency)) as window:
+            async for i, result in window:
+                final_results[i] = result
         
-        async def process_product(product: dict) -> dict:
-            async with semaphore:
-                summary = await self.generate_summary(
-                    model_name=product.get('model_name', ''),
-                    category=product.get('category', ''),
-                    series=product.get('series', ''),
-                    specs=product.get('specs', {}),
-                )
-                
+        success_count = sum(1 for r in final_results if r.get('ai_summary'))
+        logger.info("Generated %d/%d summaries", success_count, len(products))
+        
+        return final_results
+    
+    async def synthesize_stream(
+        self,
+        products: Iterable[dict],
+        concurrency: int = 8,
+    ) -> AsyncIterator[dict]:
+        """
+        Generate summaries, yielding each product as soon as it is ready.
+        
+        Results arrive in completion order, so a downstream stage (loading)
+        can start before the whole batch is summarized. Products are pulled
+        from the iterable only as request slots free up, so a lazy source
+        is never materialized in full. Unlike synthesize_batch, no health
+        check is done here - callers check first.
+        
+        Args:
+            products: Iterable of product dicts with model_name, category, series, specs
+            concurrency: Max concurrent requests
+            
+        Yields:
+            Product dicts with ai_summary added (None on failure)
+        """
+        async with aclosing(self._summarize_window(products, concurrency)) as window:
+            async for _, result in window:
+                yield result
+    
+    async def _summarize_window(
+        self,
+        products: Iterable[dict],
+        concurrency: int,
+    ) -> AsyncIterator[tuple[int, dict]]:
+        """
+        Summarize products over a sliding window of in-flight requests.
+        
+        At most `concurrency` requests run at once; the window itself is the
+        limit, so no semaphore is needed. Yields (input index, product) in
+        completion order; a failed product gets ai_summary None.
+        """
+        async def process_safely(index: int, product: dict) -> tuple[int, dict]:
+            try:
+                return index, await self._summarize_product(product)
+            except Exception as e:
+                logger.error("Error processing product %s: %s", product.get('model_name'), e)
                 result = product.copy()
-                result['ai_summary'] = summary
-                return result
+                result['ai_summary'] = None
+                return index, result
         
-        tasks = [process_product(p) for p in products]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        source = enumerate(products)
+        pending: set[asyncio.Task] = set()
         
-        # Handle any exceptions
-        final_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                logger.error(f"Error processing product {i}: {result}")
-                product = products[i].copy()
-                product['ai_summary'] = None
-                final_results.append(product)
-            else:
-                final_results.append(result)
+        def top_up(limit: int) -> None:
+            for index, product in islice(source, limit - len(pending)):
+                pending.add(asyncio.create_task(process_safely(index, product)))
         
-        success_count = sum(1 for r in final_results if r.get('ai_summary'))
-        logger.info(f"Generated {success_count}/{len(products)} summaries")
+        try:
+            # Run the first product alone so the shared prompt prefix is
+            # cached before the concurrent requests start
+            top_up(1)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Refill before yielding so requests keep flowing while the
+                # consumer handles the finished products
+                top_up(concurrency)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _summarize_product(self, product: dict) -> dict:
+        """Summarize one product."""
+        summary = await self.generate_summary(
+            model_name=product.get('model_name', ''),
+            category=product.get('category', ''),
+            series=product.get('series', ''),
+            specs=product.get('specs', {}),
+        )
         
-        return final_results
+        result = product.copy()
+        result['ai_summary'] = summary
+        return result
     
     async def __aenter__(self):
         """Async context manager entry."""
@@ -7,13 +7,18 @@ All calculations are pure Python math for 100% accuracy.
 """
 
 import logging
+import math
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Union
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(frozen=True)
 class CompatibilityResult:
     """Result of a 70V/100V compatibility check."""
     compatible: bool
@@ -23,12 +28,12 @@ class CompatibilityResult:
     message: str
 
 
-@dataclass
+@dataclass(frozen=True)
 class ImpedanceResult:
     """Result of an impedance calculation."""
     total_impedance: float
     connection: str
-    speakers: list[float]
+    speakers: tuple[float, ...]
     message: str
 
 
@@ -48,6 +53,9 @@ class ElectricalCalculator:
     # Standard 70V transformer sizes (watts)
     STANDARD_TRANSFORMER_SIZES = [50, 70, 100, 125, 150, 200, 250, 300, 500, 1000]
     
+    # Standard 70V speaker tap positions (watts), sorted ascending
+    STANDARD_TAPS = (0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+    
     # Recommended headroom percentages
     MIN_HEADROOM_PERCENT = 10.0  # Minimum safe headroom
     RECOMMENDED_HEADROOM_PERCENT = 20.0  # Recommended operating headroom
@@ -71,6 +79,26 @@ class ElectricalCalculator:
             return 0
         return int(sum(speakers))
     
+    @staticmethod
+    def calculate_total_power_batch(speakers_batch: np.ndarray) -> np.ndarray:
+        """
+        Calculate total power for many speaker sets in one vectorized pass.
+        
+        Args:
+            speakers_batch: Array of shape (B, N), one row of speaker
+                wattages per set (pad shorter sets with 0)
+            
+        Returns:
+            Integer array of shape (B,) with each set's total watts
+            
+        Example:
+            >>> ElectricalCalculator.calculate_total_power_batch(np.array([[30, 30], [25, 0]]))
+            array([60, 25])
+        """
+        totals = np.asarray(speakers_batch, dtype=np.float64).sum(axis=1)
+        # astype truncates toward zero, matching int() in calculate_total_power
+        return totals.astype(np.int64)
+    
     @staticmethod
     def verify_70v_compatibility(
         total_watts: int,
@@ -79,6 +107,9 @@ class ElectricalCalculator:
         """
         Verify if speakers are compatible with a 70V transformer.
         
+        Results are cached; the returned CompatibilityResult is frozen and
+        may be shared between callers.
+        
         Args:
             total_watts: Total speaker load in watts
             transformer_watts: Transformer capacity in watts
@@ -93,6 +124,51 @@ class ElectricalCalculator:
             >>> result.headroom_percent
             20.0
         """
+        return ElectricalCalculator._verify_70v_cached(total_watts, transformer_watts)
+    
+    @staticmethod
+    def verify_70v_compatibility_batch(
+        total_watts: np.ndarray,
+        transformer_watts: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Verify many load/transformer pairs in one vectorized pass.
+        
+        Numeric form of verify_70v_compatibility for bulk sweeps: returns
+        the compatibility flags and headroom percentages without building
+        messages. Inputs broadcast against each other.
+        
+        Args:
+            total_watts: Array of total speaker loads in watts
+            transformer_watts: Array of transformer capacities in watts
+        
+        Returns:
+            Tuple of (boolean compatibility array, headroom percentages
+            rounded to 0.1). Non-positive capacities are incompatible with
+            0.0 headroom, as in the scalar version.
+        
+        Example:
+            >>> compatible, headroom = ElectricalCalculator.verify_70v_compatibility_batch(
+            ...     np.array([120, 200, 50]), np.array([150, 150, 0]))
+            >>> compatible
+            array([ True, False, False])
+            >>> headroom
+            array([ 20. , -33.3,   0. ])
+        """
+        total_watts = np.asarray(total_watts, dtype=np.float64)
+        transformer_watts = np.asarray(transformer_watts, dtype=np.float64)
+        total_watts, transformer_watts = np.broadcast_arrays(total_watts, transformer_watts)
+        valid = transformer_watts > 0
+        headroom = np.zeros(total_watts.shape, dtype=np.float64)
+        np.divide(transformer_watts - total_watts, transformer_watts, out=headroom, where=valid)
+        headroom *= 100
+        compatible = valid & (total_watts <= transformer_watts)
+        return compatible, np.round(headroom, 1)
+    
+    @staticmethod
+    @lru_cache(maxsize=2048, typed=True)
+    def _verify_70v_cached(total_watts: int, transformer_watts: int) -> CompatibilityResult:
+        """Cached worker for verify_70v_compatibility (typed: 150 and 150.0 format differently)."""
         if transformer_watts <= 0:
             return CompatibilityResult(
                 compatible=False,
@@ -139,6 +215,9 @@ class ElectricalCalculator:
         """
         Calculate total impedance for speakers in series or parallel.
         
+        Results are cached; the returned ImpedanceResult is frozen and may
+        be shared between callers.
+        
         Args:
             speakers: List of speaker impedances in ohms
             connection: 'series' or 'parallel'
@@ -150,11 +229,22 @@ class ElectricalCalculator:
             >>> ElectricalCalculator.calculate_impedance([8, 8, 8], 'parallel')
             ImpedanceResult(total_impedance=2.67, connection='parallel', ...)
         """
+        return ElectricalCalculator._impedance_cached(connection, *speakers)
+    
+    @staticmethod
+    @lru_cache(maxsize=2048, typed=True)
+    def _impedance_cached(connection: str, *speakers: float) -> ImpedanceResult:
+        """
+        Cached worker for calculate_impedance.
+        
+        Speakers are passed as separate arguments so typed caching tells
+        8 from 8.0, which format differently in the message.
+        """
         if not speakers:
             return ImpedanceResult(
                 total_impedance=0.0,
                 connection=connection,
-                speakers=[],
+                speakers=(),
                 message="No speakers provided",
             )
         
@@ -232,6 +322,32 @@ class ElectricalCalculator:
             "message": f"Recommended: {recommended}W transformer for {total_watts}W load ({headroom:.1f}% headroom)",
         }
     
+    @staticmethod
+    def recommend_transformer_batch(loads: np.ndarray) -> np.ndarray:
+        """
+        Recommend transformer sizes for many loads in one vectorized pass.
+        
+        Uses the same 20% headroom rule as recommend_transformer, returning
+        only the recommended sizes.
+        
+        Args:
+            loads: Array of total speaker loads in watts
+            
+        Returns:
+            Integer array of recommended transformer sizes, one per load
+            
+        Example:
+            >>> ElectricalCalculator.recommend_transformer_batch(np.array([40, 100, 2000]))
+            array([  50,  125, 1000])
+        """
+        sizes = np.asarray(ElectricalCalculator.STANDARD_TRANSFORMER_SIZES, dtype=np.int64)
+        # astype truncates toward zero, matching int() in recommend_transformer
+        min_required = (np.asarray(loads, dtype=np.float64) * 1.2).astype(np.int64)
+        # Index of the first size >= min_required; loads too large for any
+        # size get the largest one
+        idx = np.searchsorted(sizes, min_required, side="left")
+        return sizes[np.minimum(idx, len(sizes) - 1)]
+    
     @staticmethod
     def calculate_70v_tap(
         desired_spl_reduction: float,
@@ -260,22 +376,26 @@ class ElectricalCalculator:
         reduction_factor = 10 ** (-desired_spl_reduction / 10)
         target_watts = full_power_watts * reduction_factor
         
-        # Standard tap positions (typical for 70V speakers)
-        standard_taps = [0.5, 1, 2, 4, 8, 16, 32, 64, 128]
-        
-        # Find closest standard tap
-        closest_tap = min(
-            [t for t in standard_taps if t <= full_power_watts],
-            key=lambda t: abs(t - target_watts),
-            default=standard_taps[0],
-        )
+        # Find the closest standard tap not above full power. Taps are
+        # sorted, so bisect to the pair around the target; ties go to the
+        # lower tap.
+        taps = ElectricalCalculator.STANDARD_TAPS
+        usable = bisect_right(taps, full_power_watts)
+        if usable == 0:
+            closest_tap = taps[0]
+        else:
+            i = bisect_left(taps, target_watts, 0, usable)
+            if i == usable:
+                closest_tap = taps[usable - 1]
+            elif i == 0:
+                closest_tap = taps[0]
+            else:
+                lower, upper = taps[i - 1], taps[i]
+                closest_tap = upper if upper - target_watts < target_watts - lower else lower
         
         # Calculate actual SPL reduction
         if closest_tap > 0 and full_power_watts > 0:
-            actual_reduction = 10 * (1 - (closest_tap / full_power_watts))
-            actual_reduction = abs(10 * (0 - (closest_tap / full_power_watts)))
             # SPL = 10 * log10(P1/P2)
-            import math
             actual_reduction = 10 * math.log10(full_power_watts / closest_tap)
         else:
             actual_reduction = 0
@@ -325,6 +445,42 @@ class ElectricalCalculator:
             "message": f"Maximum {max_speakers} speakers at {speaker_watts}W each ({actual_load}W total, {actual_headroom:.1f}% headroom)",
         }
     
+    @staticmethod
+    def max_speakers_for_transformer_batch(
+        transformer_watts: np.ndarray,
+        speaker_watts: np.ndarray,
+        headroom_percent: float = 20.0,
+    ) -> np.ndarray:
+        """
+        Calculate maximum speaker counts for many transformer/speaker pairs.
+        
+        Vectorized form of max_speakers_for_transformer returning only the
+        counts. Inputs broadcast against each other, so a column of
+        transformer sizes and a row of speaker wattages gives the full grid.
+        
+        Args:
+            transformer_watts: Array of transformer capacities
+            speaker_watts: Array of wattages per speaker
+            headroom_percent: Desired headroom percentage
+            
+        Returns:
+            Integer array of max speaker counts (0 where speaker wattage is
+            not positive)
+            
+        Example:
+            >>> ElectricalCalculator.max_speakers_for_transformer_batch(
+            ...     np.array([[100], [250]]), np.array([10, 25, 0]))
+            array([[ 8,  3,  0],
+                   [20,  8,  0]])
+        """
+        usable = np.asarray(transformer_watts, dtype=np.float64) * (1 - headroom_percent / 100)
+        speaker_watts = np.asarray(speaker_watts, dtype=np.float64)
+        usable, speaker_watts = np.broadcast_arrays(usable, speaker_watts)
+        counts = np.zeros(usable.shape, dtype=np.float64)
+        np.divide(usable, speaker_watts, out=counts, where=speaker_watts > 0)
+        # astype truncates toward zero, matching int() in the scalar version
+        return counts.astype(np.int64)
+    
     @classmethod
     def process_calculation(cls, params: dict) -> dict:
         """
@@ -359,7 +515,7 @@ class ElectricalCalculator:
                 return {
                     'total_impedance': result.total_impedance,
                     'connection': result.connection,
-                    'speakers': result.speakers,
+                    'speakers': list(result.speakers),
                     'message': result.message,
                 }
             
@@ -0,0 +1,57 @@
+"""
+Shared HTTP client for the local Ollama server.
+Embedding and synthesis traffic reuse one connection pool.
+"""
+
+import logging
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Pool size for all Ollama traffic (embeddings + generation combined)
+MAX_CONNECTIONS = 32
+
+# Idle connections are kept this long (s; httpx defaults to 5) so sparse
+# query traffic still reuses them. Plain HTTP/1.1: Ollama serves no TLS, and
+# httpx only negotiates HTTP/2 over TLS.
+KEEPALIVE_EXPIRY = 30.0
+
+# Request bodies are serialized with orjson and sent via content=,
+# so the content type has to be set explicitly
+JSON_HEADERS = {"content-type": "application/json"}
+
+
+# Global client instance
+_ollama_client: Optional[httpx.AsyncClient] = None
+
+
+async def get_ollama_client() -> httpx.AsyncClient:
+    """
+    Get the shared Ollama HTTP client.
+    Creates it on first use (or after it was closed).
+
+    The client has no base_url: callers pass absolute URLs, so clients
+    configured for different Ollama hosts can still share the pool.
+    """
+    global _ollama_client
+    if _ollama_client is None or _ollama_client.is_closed:
+        _ollama_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _ollama_client
+
+
+async def close_ollama_client() -> None:
+    """Close the shared Ollama HTTP client. Call once at application shutdown."""
+    global _ollama_client
+    if _ollama_client is not None and not _ollama_client.is_closed:
+        logger.info("Closing Ollama HTTP client")
+        await _ollama_client.aclose()
+    _ollama_client = None
@@ -5,35 +5,76 @@ Generates embeddings for semantic search using local bge-m3 model.
 
 import asyncio
 import hashlib
-import json
 import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
 import httpx
+import numpy as np
+import orjson
 
 from src.config import settings
+from src.ollama_http import JSON_HEADERS, MAX_CONNECTIONS, get_ollama_client
 
 logger = logging.getLogger(__name__)
 
 
+def quantize_embedding(vector: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    Quantize an embedding to int8 with a per-vector max-abs scale.
+    
+    Returns:
+        (int8 vector, scale); dequantize_embedding() maps them back to float32
+    """
+    scale = float(np.abs(vector).max()) / 127.0 or 1.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+
+def dequantize_embedding(quantized: np.ndarray, scale: float) -> np.ndarray:
+    """Recover a float32 embedding from quantize_embedding() output."""
+    return quantized.astype(np.float32) * np.float32(scale)
+
+
 class EmbeddingClient:
     """
     Client for generating embeddings via Ollama bge-m3.
     
     Features:
-    - Async HTTP client with connection pooling
-    - In-memory caching for query embeddings
-    - Batch embedding support
+    - Shared pooled HTTP client (src.ollama_http)
+    - In-memory LRU caching for query embeddings (float32 matrix rows,
+      or int8 rows with a per-vector scale when quantize=True)
+    - Optional SQLite cache that survives restarts (also int8 with quantize)
+    - Batch embedding support (one /api/embed request per sub-batch)
+    - Single-text embed() calls coalesced into shared batch requests
     - Health check functionality
     """
     
+    # Max texts per /api/embed request, bounding request and response size
+    EMBED_BATCH_SIZE = 64
+    
+    # How long embed() cache misses wait for others to share a request (s)
+    COALESCE_WINDOW = 0.005
+    
+    # Max keys per persistent-cache SELECT (SQLite caps bound parameters)
+    DISK_LOOKUP_CHUNK = 500
+    
     def __init__(
         self,
         base_url: Optional[str] = None,
         model: Optional[str] = None,
         dimension: int = 384,
         cache_enabled: bool = True,
+        cache_size: int = 10000,
+        cache_path: Optional[Path] = None,
+        quantize: bool = False,
+        empty_returns_zero: bool = False,
+        max_concurrency: Optional[int] = None,
     ):
         """
         Initialize embedding client.
@@ -43,34 +84,301 @@ class EmbeddingClient:
             model: Embedding model name
             dimension: Expected embedding dimension
             cache_enabled: Enable in-memory caching
+            cache_size: Max cached embeddings before least-recently-used eviction
+            cache_path: SQLite file for a persistent cache behind the in-memory
+                one (None disables it)
+            quantize: Store cached vectors (in memory and on disk) as int8
+                with a per-vector max-abs scale (4x smaller; reads return
+                dequantized float32)
+            empty_returns_zero: Return a shared read-only zero vector for empty
+                or whitespace-only texts instead of None
+            max_concurrency: Default cap on concurrent /api/embed requests
+                per embed_many call (defaults to, and is capped at, the
+                shared pool's MAX_CONNECTIONS). With a single GPU behind
+                Ollama, going past about 4 buys little: the GPU, not the
+                network, becomes the bottleneck.
         """
         self.base_url = (base_url or settings.ollama_base_url).rstrip('/')
         self.model = model or settings.ollama_embedding_model
         self.dimension = dimension
         self.cache_enabled = cache_enabled
+        # More requests than pooled connections would only queue for one
+        self.max_concurrency = min(max_concurrency or MAX_CONNECTIONS, MAX_CONNECTIONS)
         
-        self._client: Optional[httpx.AsyncClient] = None
-        self._cache: dict[str, list[float]] = {}
-    
-    async def _get_client(self) -> httpx.AsyncClient:
-        """Get or create HTTP client with connection pooling."""
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(
-                base_url=self.base_url,
-                timeout=httpx.Timeout(60.0),
-                limits=httpx.Limits(max_connections=10),
-            )
-        return self._client
+        # Empty-text result: None, or one zero vector shared by every caller
+        self._empty_result: Optional[np.ndarray] = None
+        if empty_returns_zero:
+            self._empty_result = np.zeros(dimension, dtype=np.float32)
+            self._empty_result.setflags(write=False)
+        
+        # Fixed per instance; _request_embeddings only adds the input
+        self._tags_url = f"{self.base_url}/api/tags"
+        self._embed_url = f"{self.base_url}/api/embed"
+        self._embed_payload = {"model": self.model}
+        
+        # LRU cache: vectors live in one float32 matrix, the OrderedDict maps
+        # cache key -> row in recency order
+        self._cache_size = cache_size
+        self.quantize = quantize
+        self._vecs = np.zeros(
+            (cache_size, dimension), dtype=np.int8 if quantize else np.float32
+        )
+        self._scales = np.ones(cache_size, dtype=np.float32) if quantize else None
+        self._cache_index: OrderedDict[str, int] = OrderedDict()
+        self._free_rows: list[int] = list(range(cache_size))
+        # Raw text -> cache key, so repeated texts skip normalizing and hashing
+        self._key_for = lru_cache(maxsize=cache_size)(self._cache_key)
+        
+        # Persistent cache: sqlite runs off the event loop, lookups on a
+        # reader thread and batched writes on a writer thread (each with its
+        # own connection), so requests never wait on disk writes
+        self.cache_path = cache_path
+        self._disk_local = threading.local()
+        self._disk_read_pool: Optional[ThreadPoolExecutor] = None
+        self._disk_write_pool: Optional[ThreadPoolExecutor] = None
+        self._disk_queue: Optional[asyncio.Queue] = None
+        self._disk_writer: Optional[asyncio.Task] = None
+        
+        # embed() cache misses: queued for a background task that groups
+        # whatever arrives within COALESCE_WINDOW into one request
+        self._coalesce_queue: Optional[asyncio.Queue] = None
+        self._coalescer: Optional[asyncio.Task] = None
+        self._coalesced_requests: set[asyncio.Task] = set()
     
     async def close(self) -> None:
-        """Close the HTTP client."""
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
+        """
+        Finish queued embeds, then flush and close the persistent cache.
+        
+        HTTP requests go through the shared Ollama client, which is closed
+        at application shutdown (see src.ollama_http).
+        """
+        if self._coalescer is not None and not self._coalescer.done():
+            self._coalesce_queue.put_nowait(None)
+            await self._coalescer
+        if self._coalesced_requests:
+            await asyncio.gather(*self._coalesced_requests)
+        self._coalescer = None
+        self._coalesce_queue = None
+        if self._disk_writer is not None and not self._disk_writer.done():
+            self._disk_queue.put_nowait(None)
+            await self._disk_writer
+        self._disk_writer = None
+        self._disk_queue = None
+        # Connections belong to their threads, so each is closed there
+        loop = asyncio.get_running_loop()
+        for pool in (self._disk_read_pool, self._disk_write_pool):
+            if pool is not None:
+                await loop.run_in_executor(pool, self._disk_close)
+                pool.shutdown(wait=False)
+        self._disk_read_pool = None
+        self._disk_write_pool = None
     
     def _hash_text(self, text: str) -> str:
-        """Generate cache key from text."""
-        return hashlib.sha256(text.encode()).hexdigest()[:16]
+        """Generate cache key from text (64-bit BLAKE2b; not a security boundary)."""
+        return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+    
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Canonicalize text for caching: NFKC, lowercase, collapsed whitespace."""
+        return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+    
+    def _cache_key(self, text: str) -> str:
+        """
+        Cache key for a text.
+        
+        Keyed on the normalized text, so queries differing only in case,
+        spacing or Unicode form share one cached embedding.
+        """
+        return self._hash_text(self._normalize_text(text))
+    
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        """Look up a cached embedding and mark it most recently used."""
+        row = self._cache_index.get(key)
+        if row is None:
+            return None
+        self._cache_index.move_to_end(key)
+        if self.quantize:
+            return dequantize_embedding(self._vecs[row], self._scales[row])
+        # Copy: the row is reused once this entry is evicted
+        return self._vecs[row].copy()
+    
+    def _cache_put(self, key: str, vector: np.ndarray) -> None:
+        """Store an embedding, evicting the least recently used one if full."""
+        if self._cache_size == 0 or vector.shape != (self.dimension,):
+            return
+        row = self._cache_index.get(key)
+        if row is not None:
+            self._cache_index.move_to_end(key)
+        else:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                _, row = self._cache_index.popitem(last=False)
+            self._cache_index[key] = row
+        if self.quantize:
+            self._vecs[row], self._scales[row] = quantize_embedding(vector)
+        else:
+            self._vecs[row] = vector
+    
+    async def _cached(self, key: str) -> Optional[np.ndarray]:
+        """Look up an embedding in memory, then on disk (promoting disk hits)."""
+        cached = self._cache_get(key)
+        if cached is None and self.cache_path is not None:
+            cached = (await self._disk_lookup([key])).get(key)
+            if cached is not None:
+                self._cache_put(key, cached)
+        return cached
+    
+    def _disk_pool(self, write: bool = False) -> ThreadPoolExecutor:
+        """Get the single-thread executor for disk reads (or writes)."""
+        if write:
+            if self._disk_write_pool is None:
+                self._disk_write_pool = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="embedding-cache-write"
+                )
+            return self._disk_write_pool
+        if self._disk_read_pool is None:
+            self._disk_read_pool = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="embedding-cache-read"
+            )
+        return self._disk_read_pool
+    
+    async def _disk_open(self) -> None:
+        """Open the persistent cache ahead of the first lookup."""
+        if self.cache_path is not None:
+            await asyncio.get_running_loop().run_in_executor(self._disk_pool(), self._disk_conn)
+    
+    def _disk_conn(self) -> Optional[sqlite3.Connection]:
+        """
+        Open this thread's persistent-cache connection on first use.
+        
+        Runs on the disk executor threads only; disables the persistent
+        cache if opening fails.
+        """
+        conn = getattr(self._disk_local, "conn", None)
+        if conn is None and self.cache_path is not None:
+            try:
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(self.cache_path, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS emb (
+                        model TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        vec BLOB NOT NULL,
+                        PRIMARY KEY (model, key)
+                    ) WITHOUT ROWID
+                    """
+                )
+                self._disk_local.conn = conn
+            except sqlite3.Error as e:
+                logger.warning("Persistent embedding cache disabled: %s", e)
+                self.cache_path = None
+        return conn
+    
+    def _disk_close(self) -> None:
+        """Close this thread's persistent-cache connection, if open."""
+        conn = getattr(self._disk_local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._disk_local.conn = None
+    
+    async def _disk_lookup(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Look up embeddings in the persistent cache on the reader thread."""
+        if self.cache_path is None or not keys:
+            return {}
+        return await asyncio.get_running_loop().run_in_executor(
+            self._disk_pool(), self._disk_get_many, keys
+        )
+    
+    def _disk_get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Read cached embeddings by key (runs on the reader thread)."""
+        conn = self._disk_conn()
+        if conn is None:
+            return {}
+        rows = []
+        try:
+            for i in range(0, len(keys), self.DISK_LOOKUP_CHUNK):
+                chunk = keys[i:i + self.DISK_LOOKUP_CHUNK]
+                rows += conn.execute(
+                    "SELECT key, vec FROM emb WHERE model = ? AND key IN "
+                    f"({', '.join('?' * len(chunk))})",
+                    (self.model, *chunk),
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Persistent embedding cache read failed: %s", e)
+            return {}
+        found = {}
+        for key, blob in rows:
+            # float32 vector, or (with quantize) a float32 scale + int8 vector;
+            # either form is read regardless of the current setting
+            if len(blob) == self.dimension + 4:
+                scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+                found[key] = dequantize_embedding(
+                    np.frombuffer(blob, dtype=np.int8, offset=4), scale
+                )
+            else:
+                found[key] = np.frombuffer(blob, dtype=np.float32).copy()
+        return found
+    
+    def _disk_put(self, key: str, vector: np.ndarray) -> None:
+        """Queue an embedding for the background persistent-cache writer."""
+        if self.cache_path is None or vector.shape != (self.dimension,):
+            return
+        if (
+            self._disk_writer is None
+            or self._disk_writer.done()
+            or self._disk_writer.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._disk_queue = asyncio.Queue()
+            self._disk_writer = asyncio.create_task(self._disk_write_loop(self._disk_queue))
+        if self.quantize:
+            quantized, scale = quantize_embedding(vector)
+            blob = np.float32(scale).tobytes() + quantized.tobytes()
+        else:
+            blob = vector.tobytes()
+        self._disk_queue.put_nowait((key, blob))
+    
+    async def _disk_write_loop(self, queue: asyncio.Queue) -> None:
+        """Persist queued embeddings, one transaction per burst; None stops."""
+        while True:
+            item = await queue.get()
+            rows = []
+            stop = False
+            while True:
+                if item is None:
+                    stop = True
+                else:
+                    rows.append((self.model, *item))
+                if queue.empty():
+                    break
+                item = queue.get_nowait()
+            
+            if rows:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._disk_pool(write=True), self._disk_write_rows, rows
+                )
+            if stop:
+                return
+    
+    def _disk_write_rows(self, rows: list[tuple[str, str, bytes]]) -> None:
+        """Write one burst of embeddings in a transaction (runs on the writer thread)."""
+        conn = self._disk_conn()
+        if conn is None:
+            return
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO emb (model, key, vec) VALUES (?, ?, ?)",
+                rows,
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning("Persistent embedding cache write failed: %s", e)
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
     
     async def health_check(self) -> bool:
         """
@@ -80,13 +388,13 @@ class EmbeddingClient:
             True if healthy, False otherwise
         """
         try:
-            client = await self._get_client()
-            response = await client.get("/api/tags")
+            client = await get_ollama_client()
+            response = await client.get(self._tags_url)
             
             if response.status_code != 200:
                 return False
             
-            data = response.json()
+            data = orjson.loads(response.content)
             models = [m['name'] for m in data.get('models', [])]
             
             # Check for model (with or without version tag)
@@ -94,93 +402,253 @@ class EmbeddingClient:
             return any(model_base in m for m in models)
             
         except Exception as e:
-            logger.error(f"Embedding health check failed: {e}")
+            logger.error("Embedding health check failed: %s", e)
             return False
     
-    async def embed(self, text: str) -> Optional[list[float]]:
+    async def embed(self, text: str) -> Optional[np.ndarray]:
         """
         Generate embedding for a single text.
         
+        Cache hits return immediately. Misses wait up to COALESCE_WINDOW
+        so that concurrent embed() calls share one /api/embed request.
+        
         Args:
             text: Text to embed
             
         Returns:
-            Embedding vector or None on failure
+            Embedding vector or None on failure (empty text gives None, or
+            the shared zero vector with empty_returns_zero)
         """
-        if not text or not text.strip():
-            return None
+        if not text or text.isspace():
+            return self._empty_result
+        # Cache keys normalize whitespace themselves, so hits skip strip()
+        if self.cache_enabled:
+            key = self._key_for(text)
+            cached = await self._cached(key)
+            if cached is not None:
+                return cached
+            text = text.strip()
+        else:
+            key = text = text.strip()
         
-        text = text.strip()
+        loop = asyncio.get_running_loop()
+        if (
+            self._coalescer is None
+            or self._coalescer.done()
+            or self._coalescer.get_loop() is not loop
+        ):
+            self._coalesce_queue = asyncio.Queue()
+            self._coalescer = asyncio.create_task(self._coalesce_loop(self._coalesce_queue))
+        future = loop.create_future()
+        self._coalesce_queue.put_nowait((key, text, future))
+        return await future
+    
+    async def _coalesce_loop(self, queue: asyncio.Queue) -> None:
+        """Group queued embed() misses into batch requests; None stops."""
+        stop = False
+        while not stop:
+            item = await queue.get()
+            if item is None:
+                return
+            # Let concurrent callers join before the request goes out
+            await asyncio.sleep(self.COALESCE_WINDOW)
+            
+            # Cache key -> (text, waiting futures)
+            batch: dict[str, tuple[str, list[asyncio.Future]]] = {}
+            while True:
+                key, text, future = item
+                entry = batch.get(key)
+                if entry is None:
+                    batch[key] = (text, [future])
+                else:
+                    entry[1].append(future)
+                if len(batch) >= self.EMBED_BATCH_SIZE or queue.empty():
+                    break
+                item = queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+            
+            # Dispatch without waiting, so the next batch can form meanwhile
+            task = asyncio.create_task(self._embed_coalesced(batch))
+            self._coalesced_requests.add(task)
+            task.add_done_callback(self._coalesced_requests.discard)
+    
+    async def _embed_coalesced(
+        self,
+        batch: dict[str, tuple[str, list[asyncio.Future]]],
+    ) -> None:
+        """Embed one coalesced batch and resolve its callers' futures."""
+        keys = list(batch)
+        embeddings = None
+        try:
+            embeddings = await self._request_embeddings([batch[key][0] for key in keys])
+        finally:
+            for i, key in enumerate(keys):
+                vector = None
+                if embeddings is not None:
+                    vector = embeddings[i]
+                    if self.cache_enabled:
+                        self._cache_put(key, vector)
+                        self._disk_put(key, vector)
+                for future in batch[key][1]:
+                    # Callers may have given up (cancelled) in the meantime
+                    if not future.done():
+                        future.set_result(vector)
+    
+    async def embed_many(
+        self,
+        texts: list[str],
+        concurrency: Optional[int] = None,
+    ) -> list[Optional[np.ndarray]]:
+        """
+        Generate embeddings for many texts via Ollama's batch endpoint.
         
-        # Check cache
-        if self.cache_enabled:
-            cache_key = self._hash_text(text)
-            if cache_key in self._cache:
-                return self._cache[cache_key]
+        Cache hits and duplicate texts are resolved locally (texts that
+        normalize alike count as duplicates while caching); the remaining
+        texts are sent in sub-batches of EMBED_BATCH_SIZE, each embedded in
+        a single /api/embed request.
+        
+        Args:
+            texts: List of texts to embed
+            concurrency: Max concurrent sub-batch requests (defaults to
+                max_concurrency)
+            
+        Returns:
+            List of embeddings in input order (None for failed items; empty
+            items get None or the shared zero vector, see empty_returns_zero)
+        """
+        results: list[Optional[np.ndarray]] = [None] * len(texts)
+        
+        # Texts that need a request by cache key, with every position they fill
+        missing: dict[str, tuple[str, list[int]]] = {}
+        for i, text in enumerate(texts):
+            if not text or text.isspace():
+                results[i] = self._empty_result
+                continue
+            key = self._key_for(text) if self.cache_enabled else text.strip()
+            if self.cache_enabled:
+                cached = self._cache_get(key)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            entry = missing.get(key)
+            if entry is None:
+                missing[key] = (text.strip(), [i])
+            else:
+                entry[1].append(i)
+        
+        # In-memory misses: one persistent-cache lookup for all of them
+        if self.cache_enabled and missing:
+            for key, vector in (await self._disk_lookup(list(missing))).items():
+                self._cache_put(key, vector)
+                for i in missing.pop(key)[1]:
+                    results[i] = vector
+        
+        if not missing:
+            return results
+        
+        pending = list(missing)
+        chunks = [
+            pending[i:i + self.EMBED_BATCH_SIZE]
+            for i in range(0, len(pending), self.EMBED_BATCH_SIZE)
+        ]
+        # Going past Ollama's OLLAMA_NUM_PARALLEL only queues server-side,
+        # but keeps its scheduler fed while responses are in flight
+        semaphore = asyncio.Semaphore(concurrency or min(self.max_concurrency, len(chunks)))
+        
+        async def embed_chunk(chunk: list[str]) -> None:
+            async with semaphore:
+                embeddings = await self._request_embeddings(
+                    [missing[key][0] for key in chunk]
+                )
+            if embeddings is None:
+                return
+            for key, vector in zip(chunk, embeddings, strict=True):
+                if self.cache_enabled:
+                    self._cache_put(key, vector)
+                    self._disk_put(key, vector)
+                for i in missing[key][1]:
+                    results[i] = vector
         
+        await asyncio.gather(*(embed_chunk(c) for c in chunks))
+        return results
+    
+    async def _request_embeddings(self, texts: list[str]) -> Optional[np.ndarray]:
+        """
+        Embed a sub-batch of texts in one /api/embed request.
+        
+        Returns:
+            float32 matrix with one row per text, or None if the request failed
+        """
         try:
-            client = await self._get_client()
+            client = await get_ollama_client()
             
             response = await client.post(
-                "/api/embeddings",
-                json={
-                    "model": self.model,
-                    "prompt": text,
-                },
+                self._embed_url,
+                content=orjson.dumps({**self._embed_payload, "input": texts}),
+                headers=JSON_HEADERS,
             )
             
             if response.status_code != 200:
-                logger.error(f"Embedding failed: {response.status_code}")
+                logger.error("Embedding failed: %s", response.status_code)
                 return None
             
-            data = response.json()
-            embedding = data.get('embedding', [])
+            data = orjson.loads(response.content)
+            embeddings = data.get('embeddings', [])
             
-            if len(embedding) != self.dimension:
-                logger.warning(
-                    f"Unexpected dimension: {len(embedding)} (expected {self.dimension})"
+            if len(embeddings) != len(texts):
+                logger.error(
+                    "Embedding count mismatch: %d (expected %d)",
+                    len(embeddings), len(texts),
                 )
+                return None
             
-            # Cache result
-            if self.cache_enabled:
-                self._cache[cache_key] = embedding
+            # One conversion for the whole batch instead of one per row
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            if matrix.shape[1] != self.dimension:
+                logger.warning(
+                    "Unexpected dimension: %d (expected %d)",
+                    matrix.shape[1], self.dimension,
+                )
             
-            return embedding
+            return matrix
             
         except httpx.TimeoutException:
-            logger.warning(f"Embedding timeout for text: {text[:50]}...")
+            logger.warning(
+                "Embedding timeout for %d text(s), first: %.50s...",
+                len(texts), texts[0],
+            )
             return None
         except Exception as e:
-            logger.error(f"Embedding error: {e}")
+            logger.error("Embedding error: %s", e)
             return None
     
     async def embed_batch(
         self,
         texts: list[str],
-        concurrency: int = 5,
-    ) -> list[Optional[list[float]]]:
+        concurrency: Optional[int] = None,
+    ) -> list[Optional[np.ndarray]]:
         """
         Generate embeddings for multiple texts.
         
+        Duplicate texts are embedded once and the vector is shared across
+        their positions (see embed_many).
+        
         Args:
             texts: List of texts to embed
-            concurrency: Max concurrent requests
+            concurrency: Max concurrent sub-batch requests (defaults to
+                max_concurrency)
             
         Returns:
             List of embeddings (None for failed items)
         """
-        semaphore = asyncio.Semaphore(concurrency)
-        
-        async def embed_with_semaphore(text: str) -> Optional[list[float]]:
-            async with semaphore:
-                return await self.embed(text)
-        
-        tasks = [embed_with_semaphore(t) for t in texts]
-        return await asyncio.gather(*tasks)
+        return await self.embed_many(texts, concurrency=concurrency)
     
     def clear_cache(self) -> None:
-        """Clear the embedding cache."""
-        self._cache.clear()
+        """Clear the in-memory embedding cache (the persistent cache is kept)."""
+        self._cache_index.clear()
+        self._free_rows = list(range(self._cache_size))
     
     async def __aenter__(self):
         """Async context manager entry."""
@@ -196,14 +664,36 @@ _embedding_client: Optional[EmbeddingClient] = None
 
 
 async def get_embedding_client() -> EmbeddingClient:
-    """Get the global embedding client instance."""
+    """
+    Get the global embedding client instance.
+    
+    Created on first use, with the shared HTTP client and the persistent
+    cache set up right away so the first query does not pay for them.
+    No lock is needed: the instance is published before the first await,
+    so concurrent callers on the event loop all see the same one.
+    """
     global _embedding_client
     if _embedding_client is None:
-        _embedding_client = EmbeddingClient()
+        _embedding_client = EmbeddingClient(
+            cache_path=settings.query_embeddings_cache if settings.cache_embeddings else None,
+        )
+        await _embedding_client._disk_open()
+        await get_ollama_client()
     return _embedding_client
 
 
-async def embed_query(query: str) -> Optional[list[float]]:
+async def close_embedding_client() -> None:
+    """
+    Close the global embedding client, finishing queued embeds and cache
+    writes. Call once at application shutdown, before close_ollama_client().
+    """
+    global _embedding_client
+    if _embedding_client is not None:
+        await _embedding_client.close()
+    _embedding_client = None
+
+
+async def embed_query(query: str) -> Optional[np.ndarray]:
     """
     Convenience function to embed a query string.
     
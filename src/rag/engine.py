@@ -3,10 +3,11 @@ Main Query Engine.
 Orchestrates the complete query processing pipeline.
 """
 
+import asyncio
 import logging
 from typing import Optional
 
-from src.rag.embeddings import EmbeddingClient
+from src.rag.embeddings import EmbeddingClient, embed_query
 from src.rag.router import QueryRouter, QueryType
 from src.rag.retrieval import HybridRetriever, RetrievalResult
 from src.rag.generator import AnswerGenerator, GeneratedAnswer
@@ -52,6 +53,11 @@ class QueryEngine:
         user_query = user_query.strip()
         logger.info(f"Processing query: {user_query[:100]}")
         
+        # Speculatively embed the query while it is being classified; search
+        # paths use the result, the others cancel it (a coalesced embedding
+        # still completes and lands in the cache)
+        embed_task = asyncio.create_task(embed_query(user_query))
+        
         try:
             # Step 1: Classify query intent
             query_type = await self.router.classify(user_query)
@@ -59,15 +65,17 @@ class QueryEngine:
             
             # Step 2: Route to appropriate handler
             if query_type == QueryType.DIRECT_LOOKUP:
-                return await self._handle_direct_lookup(user_query)
+                return await self._handle_direct_lookup(user_query, embed_task)
             
             elif query_type == QueryType.CALCULATION:
+                embed_task.cancel()
                 return await self._handle_calculation(user_query)
             
             elif query_type == QueryType.SEMANTIC_SEARCH:
-                return await self._handle_semantic_search(user_query)
+                return await self._handle_semantic_search(user_query, embed_task)
             
             else:
+                embed_task.cancel()
                 return GeneratedAnswer(
                     answer="I'm not sure how to handle that query. "
                            "Try asking about specific products or calculations.",
@@ -80,16 +88,31 @@ class QueryEngine:
                 answer=f"An error occurred: {str(e)}",
                 query_type="error",
             )
+        
+        finally:
+            # Direct hits and errors never awaited the embedding
+            embed_task.cancel()
     
-    async def _handle_direct_lookup(self, query: str) -> GeneratedAnswer:
-        """Handle direct product lookup queries."""
+    async def _handle_direct_lookup(
+        self,
+        query: str,
+        embed_task: Optional[asyncio.Task] = None,
+    ) -> GeneratedAnswer:
+        """
+        Handle direct product lookup queries.
+        
+        Args:
+            query: User query
+            embed_task: Query embedding already in flight, used if the
+                lookup falls back to semantic search
+        """
         # Extract model name from query
         model_name = self.router.extract_model_name(query)
         
         if not model_name:
             # Fall back to semantic search
             logger.debug("No model name found, falling back to semantic search")
-            return await self._handle_semantic_search(query)
+            return await self._handle_semantic_search(query, embed_task)
         
         # Look up product
         result = await self.retriever.direct_lookup(model_name)
@@ -123,13 +146,29 @@ class QueryEngine:
         # Format answer
         return self.generator.generate_calculation_answer(query, calc_result)
     
-    async def _handle_semantic_search(self, query: str) -> GeneratedAnswer:
-        """Handle semantic search queries."""
-        # Extract filters
+    async def _handle_semantic_search(
+        self,
+        query: str,
+        embed_task: Optional[asyncio.Task] = None,
+    ) -> GeneratedAnswer:
+        """
+        Handle semantic search queries.
+        
+        Args:
+            query: User query
+            embed_task: Query embedding already in flight (started here
+                if not given)
+        """
+        # Start embedding the query, and extract filters while it runs
+        if embed_task is None:
+            embed_task = asyncio.create_task(embed_query(query))
         filters = self.router.extract_filters(query)
+        query_embedding = await embed_task
         
         # Perform hybrid search
-        results = await self.retriever.semantic_search(query, filters)
+        results = await self.retriever.semantic_search(
+            query, filters, query_embedding=query_embedding
+        )
         
         if not results:
             return GeneratedAnswer(
@@ -139,7 +178,9 @@ class QueryEngine:
             )
         
         # Generate answer with LLM
-        return await self.generator.generate_search_answer(query, results)
+        return await self.generator.generate_search_answer(
+            query, results, query_embedding=query_embedding
+        )
     
     async def get_product(self, model_name: str) -> Optional[RetrievalResult]:
         """Get a specific product by model name."""
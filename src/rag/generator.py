@@ -3,28 +3,94 @@ Answer Generator with citations.
 Uses Ollama LLM to generate answers based on retrieved product data.
 """
 
+import asyncio
 import logging
-from dataclasses import dataclass, field, asdict
-from typing import Any, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Any, AsyncIterator, Optional
 
 import httpx
+import numpy as np
+import orjson
 
 from src.config import settings
-from src.rag.retrieval import RetrievalResult
+from src.ollama_http import JSON_HEADERS, get_ollama_client
+from src.rag.retrieval import RetrievalResult, intern_short
 
 logger = logging.getLogger(__name__)
 
+# Raw datasheet labels that carry the same spec as a normalized key. Their
+# values are shown as extracted (they already include the unit).
+_SPEC_ALIASES = {
+    'power_watts': ('Power Handling (Long-term)',),
+    'impedance_ohms': ('Nominal Impedance',),
+    'sensitivity_db': ('Sensitivity (SPL/1W@1m)',),
+    'driver_components': ('Driver Components',),
+}
 
-@dataclass
+# Specs for direct lookup answers, in display order:
+# (key, label, unit, keys to try - normalized key first, then aliases)
+_DIRECT_SPECS = tuple(
+    (key, label, unit, (key, *_SPEC_ALIASES.get(key, ())))
+    for key, label, unit in (
+        ('power_watts', 'Power', 'W'),
+        ('power_lf_watts', 'Power (LF)', 'W'),
+        ('power_hf_watts', 'Power (HF)', 'W'),
+        ('freq_min_hz', 'Frequency Min', 'Hz'),
+        ('freq_max_hz', 'Frequency Max', 'Hz'),
+        ('impedance_ohms', 'Impedance', 'Ω'),
+        ('sensitivity_db', 'Sensitivity', 'dB'),
+        ('coverage', 'Coverage', ''),
+        ('driver_components', 'Drivers', ''),
+        ('voltage_type', 'Voltage Type', ''),
+        ('weight_kg', 'Weight', 'kg'),
+        ('color_options', 'Colors', ''),
+        ('environmental', 'Environmental', ''),
+    )
+)
+
+# Specs included in the LLM prompt: keys to try per spec
+_PROMPT_SPECS = tuple(
+    (key, *_SPEC_ALIASES.get(key, ()))
+    for key in (
+        'power_watts', 'voltage_type', 'freq_min_hz', 'freq_max_hz',
+        'impedance_ohms', 'coverage', 'driver_components',
+    )
+)
+
+
+def _find_spec(specs: dict[str, Any], keys: tuple[str, ...]) -> tuple[Optional[str], Any]:
+    """Return (key, value) for the first of keys set in specs, or (None, None)."""
+    for key in keys:
+        value = specs.get(key)
+        if value is not None:
+            return key, value
+    return None, None
+
+
+@dataclass(slots=True, frozen=True)
 class Citation:
-    """A citation reference to source data."""
+    """A citation reference to source data (immutable, so it can be shared)."""
     model_name: str
     field: str
     value: Any
     pdf_source: Optional[str] = None
+    
+    def __post_init__(self):
+        # Spec labels and short values repeat across answers: share one copy
+        object.__setattr__(self, "field", intern_short(self.field))
+        object.__setattr__(self, "value", intern_short(self.value))
+    
+    def to_dict(self) -> dict:
+        return {
+            "model_name": self.model_name,
+            "field": self.field,
+            "value": self.value,
+            "pdf_source": self.pdf_source,
+        }
 
 
-@dataclass
+@dataclass(slots=True)
 class GeneratedAnswer:
     """Generated answer with citations and metadata."""
     answer: str
@@ -36,7 +102,7 @@ class GeneratedAnswer:
     def to_dict(self) -> dict:
         return {
             "answer": self.answer,
-            "citations": [asdict(c) for c in self.citations],
+            "citations": [c.to_dict() for c in self.citations],
             "confidence": self.confidence,
             "query_type": self.query_type,
             "products_used": self.products_used,
@@ -51,26 +117,43 @@ class AnswerGenerator:
     while maintaining factual accuracy through citations.
     """
     
-    # Answer generation prompt template
-    GENERATION_PROMPT = """You are a Bose professional audio product expert.
+    # Instructions shared by every generation request. Kept byte-identical
+    # and at the very start of the prompt so Ollama can reuse the cached
+    # prefix (KV state) across requests; everything per-request comes after.
+    STATIC_SYSTEM = """You are a Bose professional audio product expert.
 Answer the user's question using ONLY the product data provided below.
 Do NOT make up any specifications or information not in the data.
 Be concise and factual.
 If the answer is not in the data, say "I don't have that information."
 
-User Question: {query}
-
-Product Data:
-{product_data}
-
 Instructions:
 1. Answer the question directly
 2. Include specific values from the data
 3. Mention model names when relevant
-4. Keep answer under 150 words
+4. Keep answer under 150 words"""
+
+    # Answer generation prompt template (static prefix, then data, then query)
+    GENERATION_PROMPT = STATIC_SYSTEM + """
 
+Product Data:
+{product_data}
+
+User Question: {query}
 Answer:"""
 
+    # Semantic answer cache: a search answer is reused for a later query
+    # whose embedding has at least this cosine similarity and that retrieved
+    # the same products. The threshold is kept high so near-misses still
+    # reach the LLM.
+    ANSWER_CACHE_SIZE = 256
+    ANSWER_CACHE_THRESHOLD = 0.95
+
+    # Search answers skip the LLM and use the direct lookup format when the
+    # top result is named in the query at this similarity, or is the only
+    # result at DIRECT_SINGLE_THRESHOLD
+    DIRECT_NAMED_THRESHOLD = 0.92
+    DIRECT_SINGLE_THRESHOLD = 0.85
+
     # Direct lookup template (no LLM needed)
     DIRECT_ANSWER_TEMPLATE = """Based on the specifications for **{model_name}**:
 
@@ -92,22 +175,37 @@ Answer:"""
         """
         self.base_url = (base_url or settings.ollama_base_url).rstrip('/')
         self.model = model or settings.ollama_llm_model
-        self._client: Optional[httpx.AsyncClient] = None
+        
+        # Fixed per instance; _call_llm only adds the prompt
+        self._generate_url = f"{self.base_url}/api/generate"
+        self._generate_payload = {
+            "model": self.model,
+            "stream": False,
+            "options": {
+                "temperature": 0.3,
+                "num_predict": 300,
+            },
+        }
+        
+        # Bounds concurrent /api/generate calls to what Ollama runs in parallel
+        self._generation_slots = asyncio.Semaphore(settings.ollama_num_parallel)
+        
+        # (retrieved model names, query) -> (unit query embedding, answer)
+        self._answer_cache: OrderedDict[
+            tuple[tuple[str, ...], str], tuple[np.ndarray, GeneratedAnswer]
+        ] = OrderedDict()
     
     async def _get_client(self) -> httpx.AsyncClient:
-        """Get or create HTTP client."""
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(
-                base_url=self.base_url,
-                timeout=httpx.Timeout(60.0),
-            )
-        return self._client
+        """Get the shared Ollama HTTP client (pooled keep-alive connections)."""
+        return await get_ollama_client()
     
     async def close(self) -> None:
-        """Close the HTTP client."""
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
+        """
+        Release resources held by the generator.
+        
+        Requests go through the shared Ollama client, which is closed at
+        application shutdown (see src.ollama_http), so nothing is held here.
+        """
     
     async def generate_direct_answer(
         self,
@@ -130,37 +228,23 @@ Answer:"""
         citations = []
         specs_lines = []
         
-        # Format key specifications
-        spec_mappings = [
-            ('power_watts', 'Power', 'W'),
-            ('power_lf_watts', 'Power (LF)', 'W'),
-            ('power_hf_watts', 'Power (HF)', 'W'),
-            ('freq_min_hz', 'Frequency Min', 'Hz'),
-            ('freq_max_hz', 'Frequency Max', 'Hz'),
-            ('impedance_ohms', 'Impedance', 'Ω'),
-            ('sensitivity_db', 'Sensitivity', 'dB'),
-            ('coverage', 'Coverage', ''),
-            ('driver_components', 'Drivers', ''),
-            ('voltage_type', 'Voltage Type', ''),
-            ('weight_kg', 'Weight', 'kg'),
-            ('color_options', 'Colors', ''),
-            ('environmental', 'Environmental', ''),
-        ]
-        
-        for key, label, unit in spec_mappings:
-            if key in specs and specs[key] is not None:
-                value = specs[key]
-                if unit:
-                    specs_lines.append(f"- **{label}**: {value} {unit}")
-                else:
-                    specs_lines.append(f"- **{label}**: {value}")
-                
-                citations.append(Citation(
-                    model_name=result.model_name,
-                    field=key,
-                    value=value,
-                    pdf_source=result.pdf_source,
-                ))
+        # Format key specifications (one line per spec, even if it is present
+        # under both its normalized key and a raw datasheet label)
+        for key, label, unit, keys in _DIRECT_SPECS:
+            found, value = _find_spec(specs, keys)
+            if found is None:
+                continue
+            if unit and found == key:
+                specs_lines.append(f"- **{label}**: {value} {unit}")
+            else:
+                specs_lines.append(f"- **{label}**: {value}")
+            
+            citations.append(Citation(
+                model_name=result.model_name,
+                field=found,
+                value=value,
+                pdf_source=result.pdf_source,
+            ))
         
         specs_text = "\n".join(specs_lines) if specs_lines else "No specifications available"
         
@@ -178,17 +262,79 @@ Answer:"""
             products_used=[result.model_name],
         )
     
+    def _is_direct_match(self, query: str, results: list[RetrievalResult]) -> bool:
+        """Whether the top result alone answers the query (see DIRECT_*_THRESHOLD)."""
+        top = results[0]
+        if len(results) == 1 and top.similarity_score >= self.DIRECT_SINGLE_THRESHOLD:
+            return True
+        return (
+            top.similarity_score >= self.DIRECT_NAMED_THRESHOLD
+            and top.model_name.casefold() in query.casefold()
+        )
+    
+    def _cached_answer(
+        self,
+        products: tuple[str, ...],
+        embedding: np.ndarray,
+    ) -> Optional[GeneratedAnswer]:
+        """
+        Find a cached answer for a semantically equivalent query.
+        
+        Args:
+            products: Model names of the retrieved products, in order
+            embedding: Unit-length query embedding
+            
+        Returns:
+            Copy of the closest cached answer (confidence lowered slightly),
+            or None if no entry for these products is similar enough
+        """
+        keys = [key for key in self._answer_cache if key[0] == products]
+        if not keys:
+            return None
+        
+        cached = np.stack([self._answer_cache[key][0] for key in keys])
+        similarities = cached @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.ANSWER_CACHE_THRESHOLD:
+            return None
+        
+        self._answer_cache.move_to_end(keys[best])
+        answer = self._answer_cache[keys[best]][1]
+        return replace(answer, confidence=answer.confidence * 0.95)
+    
+    def _cache_answer(
+        self,
+        key: tuple[tuple[str, ...], str],
+        embedding: np.ndarray,
+        answer: GeneratedAnswer,
+    ) -> None:
+        """Store an LLM answer, evicting the least recently used one if full."""
+        self._answer_cache[key] = (embedding, answer)
+        self._answer_cache.move_to_end(key)
+        if len(self._answer_cache) > self.ANSWER_CACHE_SIZE:
+            self._answer_cache.popitem(last=False)
+    
     async def generate_search_answer(
         self,
         query: str,
         results: list[RetrievalResult],
+        query_embedding: Optional[np.ndarray] = None,
     ) -> GeneratedAnswer:
         """
         Generate answer for semantic search queries using LLM.
         
+        If the top result is named in the query (or is the only result) and
+        matches closely, its specs are returned directly without an LLM call.
+        
+        With a query embedding, answers are cached: a later query that
+        retrieved the same products and embeds almost identically (cosine
+        similarity >= ANSWER_CACHE_THRESHOLD) reuses the answer without an
+        LLM call.
+        
         Args:
             query: Original user query
             results: Retrieved products
+            query_embedding: Embedding of the query (enables the answer cache)
             
         Returns:
             Generated answer with citations
@@ -202,6 +348,25 @@ Answer:"""
                 products_used=[],
             )
         
+        # A single clear match needs no LLM: answer with its specs directly
+        if self._is_direct_match(query, results):
+            return await self.generate_direct_answer(query, results[0])
+        
+        # Reuse the answer to a semantically equivalent query, if any
+        cache_key = None
+        embedding = None
+        if query_embedding is not None:
+            embedding = np.asarray(query_embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(embedding))
+            if norm > 0:
+                embedding = embedding / norm
+                products = tuple(r.model_name for r in results)
+                cache_key = (products, query)
+                cached = self._cached_answer(products, embedding)
+                if cached is not None:
+                    logger.debug(f"Semantic answer cache hit: {query[:50]}")
+                    return cached
+        
         # Format product data for LLM
         product_data = self._format_products_for_llm(results)
         
@@ -212,34 +377,18 @@ Answer:"""
         )
         
         try:
-            client = await self._get_client()
-            
-            response = await client.post(
-                "/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "num_predict": 300,
-                    },
-                },
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"LLM generation failed: {response.status_code}")
+            answer_text = await self._call_llm(prompt)
+            if answer_text is None:
                 return self._fallback_answer(results)
             
-            data = response.json()
-            answer_text = data.get('response', '').strip()
-            
             # Build citations from used products
             citations = []
             products_used = []
             
+            # Case-folded once; casefold() also matches Unicode case variants
+            answer_folded = answer_text.casefold()
             for result in results:
-                if result.model_name.lower() in answer_text.lower():
+                if result.model_name.casefold() in answer_folded:
                     products_used.append(result.model_name)
                     
                     # Add key spec citations
@@ -259,18 +408,144 @@ Answer:"""
             # Calculate confidence based on similarity scores
             avg_similarity = sum(r.similarity_score for r in results) / len(results)
             
-            return GeneratedAnswer(
+            answer = GeneratedAnswer(
                 answer=answer_text,
                 citations=citations,
                 confidence=min(avg_similarity + 0.2, 1.0),
                 query_type="semantic_search",
                 products_used=products_used,
             )
+            if cache_key is not None:
+                self._cache_answer(cache_key, embedding, answer)
+            return answer
             
         except Exception as e:
             logger.error(f"Answer generation error: {e}")
             return self._fallback_answer(results)
     
+    async def generate_search_answer_stream(
+        self,
+        query: str,
+        results: list[RetrievalResult],
+    ) -> AsyncIterator[str]:
+        """
+        Stream the answer for a semantic search query as it is generated.
+        
+        Yields text pieces as Ollama produces them, so callers can show the
+        first words after one token instead of after the whole answer. No
+        citations are built; use generate_search_answer for a full
+        GeneratedAnswer.
+        
+        Args:
+            query: Original user query
+            results: Retrieved products
+            
+        Yields:
+            Answer text pieces (the fallback answer if generation fails
+            before producing any text)
+        """
+        if not results:
+            yield "I couldn't find any products matching your criteria."
+            return
+        
+        if self._is_direct_match(query, results):
+            yield (await self.generate_direct_answer(query, results[0])).answer
+            return
+        
+        prompt = self.GENERATION_PROMPT.format(
+            query=query,
+            product_data=self._format_products_for_llm(results),
+        )
+        
+        started = False
+        try:
+            async with self._generation_slots:
+                client = await self._get_client()
+                async with client.stream(
+                    "POST",
+                    self._generate_url,
+                    content=orjson.dumps(
+                        {**self._generate_payload, "stream": True, "prompt": prompt}
+                    ),
+                    headers=JSON_HEADERS,
+                ) as response:
+                    if response.status_code != 200:
+                        logger.error(f"LLM generation failed: {response.status_code}")
+                    else:
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = orjson.loads(line)
+                            if 'error' in chunk:
+                                logger.error(f"LLM generation error: {chunk['error']}")
+                                break
+                            piece = chunk.get('response', '')
+                            if not started:
+                                piece = piece.lstrip()
+                            if piece:
+                                started = True
+                                yield piece
+                            if chunk.get('done'):
+                                break
+        except Exception as e:
+            logger.error(f"Answer generation error: {e}")
+        
+        if not started:
+            yield self._fallback_answer(results).answer
+    
+    async def generate_search_answer_batch(
+        self,
+        queries_and_results: list[tuple[str, list[RetrievalResult]]],
+        query_embeddings: Optional[list[Optional[np.ndarray]]] = None,
+    ) -> list[GeneratedAnswer]:
+        """
+        Generate answers for several semantic search queries concurrently.
+        
+        Generations overlap up to settings.ollama_num_parallel at a time.
+        Queries given an embedding read and populate the answer cache, as
+        in generate_search_answer.
+        
+        Args:
+            queries_and_results: (query, retrieved products) pairs
+            query_embeddings: Optional query embeddings, one per pair (None
+                entries skip the answer cache for that query)
+            
+        Returns:
+            One generated answer per pair, in order
+        """
+        if query_embeddings is None:
+            query_embeddings = [None] * len(queries_and_results)
+        elif len(query_embeddings) != len(queries_and_results):
+            raise ValueError("query_embeddings must have one entry per query")
+        
+        return list(await asyncio.gather(*(
+            self.generate_search_answer(query, results, query_embedding=embedding)
+            for (query, results), embedding in zip(queries_and_results, query_embeddings, strict=True)
+        )))
+    
+    async def _call_llm(self, prompt: str) -> Optional[str]:
+        """
+        Run one LLM generation, waiting for a free generation slot.
+        
+        Returns:
+            Stripped answer text, or None if Ollama returned an error status
+        """
+        async with self._generation_slots:
+            client = await self._get_client()
+            
+            response = await client.post(
+                self._generate_url,
+                content=orjson.dumps({**self._generate_payload, "prompt": prompt}),
+                headers=JSON_HEADERS,
+            )
+        
+        if response.status_code != 200:
+            logger.error(f"LLM generation failed: {response.status_code}")
+            return None
+        
+        data = orjson.loads(response.content)
+        return data.get('response', '').strip()
+    
     def generate_calculation_answer(
         self,
         query: str,
@@ -300,34 +575,48 @@ Answer:"""
         # Format based on calculation type
         if 'compatible' in calc_result:
             # 70V compatibility check
-            compatible = "✅ Yes" if calc_result['compatible'] else "❌ No"
-            answer = f"""**70V Compatibility Check**
-
-{compatible}, this configuration is {"compatible" if calc_result['compatible'] else "NOT compatible"}.
-
-- **Total Load**: {calc_result['total_load']} W
-- **Transformer Capacity**: {calc_result['capacity']} W
-- **Headroom**: {calc_result['headroom_percent']:.1f}%
-
-{"The total speaker load is within the transformer's capacity." if calc_result['compatible'] else "The total speaker load exceeds the transformer's capacity. Use a larger transformer or reduce speakers."}"""
+            if calc_result['compatible']:
+                verdict = "✅ Yes, this configuration is compatible."
+                advice = "The total speaker load is within the transformer's capacity."
+            else:
+                verdict = "❌ No, this configuration is NOT compatible."
+                advice = ("The total speaker load exceeds the transformer's capacity. "
+                          "Use a larger transformer or reduce speakers.")
+            lines = [
+                "**70V Compatibility Check**",
+                "",
+                verdict,
+                "",
+                f"- **Total Load**: {calc_result['total_load']} W",
+                f"- **Transformer Capacity**: {calc_result['capacity']} W",
+                f"- **Headroom**: {calc_result['headroom_percent']:.1f}%",
+                "",
+                advice,
+            ]
         
         elif 'total_impedance' in calc_result:
             # Impedance calculation
-            answer = f"""**Impedance Calculation**
-
-- **Connection Type**: {calc_result.get('connection', 'unknown').title()}
-- **Total Impedance**: {calc_result['total_impedance']:.2f} Ω
-- **Speakers**: {calc_result.get('speakers', [])}"""
+            lines = [
+                "**Impedance Calculation**",
+                "",
+                f"- **Connection Type**: {calc_result.get('connection', 'unknown').title()}",
+                f"- **Total Impedance**: {calc_result['total_impedance']:.2f} Ω",
+                f"- **Speakers**: {calc_result.get('speakers', [])}",
+            ]
         
         elif 'total_power' in calc_result:
             # Simple power sum
-            answer = f"""**Power Calculation**
-
-- **Total Power**: {calc_result['total_power']} W
-- **Speakers**: {calc_result.get('speakers', [])}"""
+            lines = [
+                "**Power Calculation**",
+                "",
+                f"- **Total Power**: {calc_result['total_power']} W",
+                f"- **Speakers**: {calc_result.get('speakers', [])}",
+            ]
         
         else:
-            answer = f"Calculation result: {calc_result}"
+            lines = [f"Calculation result: {calc_result}"]
+        
+        answer = "\n".join(lines)
         
         return GeneratedAnswer(
             answer=answer,
@@ -338,10 +627,16 @@ Answer:"""
         )
     
     def _format_products_for_llm(self, results: list[RetrievalResult]) -> str:
-        """Format products for LLM prompt."""
+        """
+        Format products for LLM prompt.
+        
+        The top 5 results are listed by model name rather than by score, so
+        the same retrieval set always yields the same text (and prompt prefix).
+        """
         lines = []
         
-        for i, result in enumerate(results[:5], 1):  # Limit to top 5
+        top = sorted(results[:5], key=lambda r: r.model_name)  # Limit to top 5
+        for i, result in enumerate(top, 1):
             lines.append(f"\n### Product {i}: {result.model_name}")
             
             if result.category:
@@ -351,10 +646,10 @@ Answer:"""
             
             # Key specs
             specs = result.specs
-            for key in ['power_watts', 'voltage_type', 'freq_min_hz', 'freq_max_hz', 
-                       'impedance_ohms', 'coverage', 'driver_components']:
-                if key in specs and specs[key]:
-                    lines.append(f"  {key}: {specs[key]}")
+            for keys in _PROMPT_SPECS:
+                found, value = _find_spec(specs, keys)
+                if value:
+                    lines.append(f"  {found}: {value}")
             
             if result.ai_summary:
                 lines.append(f"  Summary: {result.ai_summary}")
@@ -3,19 +3,42 @@ Hybrid Retrieval System.
 Combines SQL filtering with vector similarity search for optimal results.
 """
 
-import json
 import logging
-from dataclasses import dataclass, asdict
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import Any, Optional
 
+import numpy as np
+
 from src.config import settings
 from src.database import get_db
 from src.rag.embeddings import embed_query
 
 logger = logging.getLogger(__name__)
 
+# Search filter -> SQL predicate ({} is the bind parameter number)
+_FILTER_PREDICATES = (
+    ('min_watts', "watts_int >= ${}"),
+    ('max_watts', "watts_int <= ${}"),
+    ('voltage_type', "voltage_type = ${}"),
+    ('category', "category = ${}"),
+    ('series', "series = ${}"),
+)
+
+# Strings shorter than this (model names, categories, series, PDF names)
+# are interned so repeated results share one copy
+INTERN_MAX_LEN = 80
+
 
-@dataclass
+def intern_short(value: Any) -> Any:
+    """Intern value if it is a short string; return anything else as is."""
+    if isinstance(value, str) and len(value) < INTERN_MAX_LEN:
+        return sys.intern(value)
+    return value
+
+
+@dataclass(slots=True)
 class RetrievalResult:
     """A single retrieval result with product data and scores."""
     model_name: str
@@ -27,7 +50,16 @@ class RetrievalResult:
     pdf_source: Optional[str] = None
     
     def to_dict(self) -> dict:
-        return asdict(self)
+        # Flat dict instead of asdict(): no recursive deep copy of specs
+        return {
+            "model_name": self.model_name,
+            "category": self.category,
+            "series": self.series,
+            "specs": self.specs,
+            "ai_summary": self.ai_summary,
+            "similarity_score": self.similarity_score,
+            "pdf_source": self.pdf_source,
+        }
 
 
 class HybridRetriever:
@@ -44,6 +76,10 @@ class HybridRetriever:
     - Latency target: <3 seconds
     """
     
+    # Decoded specs dicts kept per model, so repeat retrievals of a product
+    # share one dict instead of holding a fresh copy per result
+    SPECS_CACHE_SIZE = 1024
+    
     def __init__(
         self,
         max_candidates: int = 100,
@@ -58,6 +94,7 @@ class HybridRetriever:
         """
         self.max_candidates = max_candidates
         self.final_limit = final_limit
+        self._specs_cache: OrderedDict[str, dict[str, Any]] = OrderedDict()
     
     async def direct_lookup(self, model_name: str) -> Optional[RetrievalResult]:
         """
@@ -106,6 +143,7 @@ class HybridRetriever:
         query: str,
         filters: Optional[dict] = None,
         limit: Optional[int] = None,
+        query_embedding: Optional[np.ndarray] = None,
     ) -> list[RetrievalResult]:
         """
         Semantic search with optional SQL filters.
@@ -114,6 +152,8 @@ class HybridRetriever:
             query: User query for semantic matching
             filters: Optional SQL filters (min_watts, voltage_type, etc.)
             limit: Max results to return
+            query_embedding: Precomputed embedding of the query; embedded
+                here if not given
             
         Returns:
             List of RetrievalResult sorted by relevance
@@ -121,8 +161,11 @@ class HybridRetriever:
         limit = limit or self.final_limit
         filters = filters or {}
         
-        # Generate query embedding
-        query_embedding = await embed_query(query)
+        # Generate query embedding (unless the caller already has it). No
+        # cache here: embed_query() is served from the embedding client's
+        # LRU (keyed on case/whitespace-normalized text) and disk cache.
+        if query_embedding is None:
+            query_embedding = await embed_query(query)
         
         if query_embedding is None:
             logger.warning("Failed to generate query embedding, falling back to SQL only")
@@ -133,9 +176,34 @@ class HybridRetriever:
         
         return results
     
+    @staticmethod
+    def _filter_clauses(filters: dict, first_param: int) -> tuple[list[str], list[Any]]:
+        """
+        Build SQL predicates and their parameters for the search filters.
+        
+        Predicates always come in the same order, so each combination of
+        filters yields one SQL text (at most 32) that asyncpg's statement
+        cache keeps prepared.
+        
+        Args:
+            filters: Search filters (min_watts, max_watts, voltage_type,
+                category, series)
+            first_param: Number of the first bind parameter to use
+            
+        Returns:
+            (predicates, parameters)
+        """
+        clauses = []
+        params = []
+        for key, predicate in _FILTER_PREDICATES:
+            if key in filters:
+                clauses.append(predicate.format(first_param + len(params)))
+                params.append(filters[key])
+        return clauses, params
+    
     async def _hybrid_search(
         self,
-        query_embedding: list[float],
+        query_embedding: np.ndarray,
         filters: dict,
         limit: int,
     ) -> list[RetrievalResult]:
@@ -145,59 +213,71 @@ class HybridRetriever:
         db = await get_db()
         
         # Build WHERE clause from filters
-        where_clauses = ["embedding IS NOT NULL"]
-        params = [query_embedding]
-        param_idx = 2
-        
-        if 'min_watts' in filters:
-            where_clauses.append(f"watts_int >= ${param_idx}")
-            params.append(filters['min_watts'])
-            param_idx += 1
-        
-        if 'max_watts' in filters:
-            where_clauses.append(f"watts_int <= ${param_idx}")
-            params.append(filters['max_watts'])
-            param_idx += 1
-        
-        if 'voltage_type' in filters:
-            where_clauses.append(f"voltage_type = ${param_idx}")
-            params.append(filters['voltage_type'])
-            param_idx += 1
-        
-        if 'category' in filters:
-            where_clauses.append(f"category = ${param_idx}")
-            params.append(filters['category'])
-            param_idx += 1
-        
-        if 'series' in filters:
-            where_clauses.append(f"series = ${param_idx}")
-            params.append(filters['series'])
-            param_idx += 1
+        filter_clauses, params = self._filter_clauses(filters, first_param=2)
+        where_clauses = ["embedding IS NOT NULL", *filter_clauses]
+        params = [query_embedding, *params]
+        param_idx = len(params) + 1
         
         where_clause = " AND ".join(where_clauses)
         
-        # Execute hybrid query with cosine distance
-        query = f"""
-            SELECT 
-                model_name,
-                category,
-                series,
-                specs,
-                ai_summary,
-                pdf_source,
-                1 - (embedding <=> $1) as similarity
-            FROM products
-            WHERE {where_clause}
-            ORDER BY embedding <=> $1
-            LIMIT {limit}
-        """
+        # LIMIT is bound too: the SQL text then depends only on which filters
+        # are set, so asyncpg's per-connection statement cache reuses the
+        # prepared plan instead of re-parsing for every limit
+        params.append(limit)
+        
+        if len(where_clauses) == 1:
+            # No filters: one pass, ordered by the vector index
+            query = f"""
+                SELECT 
+                    model_name,
+                    category,
+                    series,
+                    specs,
+                    ai_summary,
+                    pdf_source,
+                    embedding <=> $1 AS distance
+                FROM products
+                WHERE {where_clause}
+                ORDER BY distance
+                LIMIT ${param_idx}
+            """
+        else:
+            # Stage 1 applies the hard filters, stage 2 ranks exactly the rows
+            # that passed them. In a single pass the planner may take the
+            # IVFFlat index and filter its candidates afterwards, which can
+            # return fewer than `limit` rows for selective filters.
+            query = f"""
+                WITH filtered AS MATERIALIZED (
+                    SELECT 
+                        model_name,
+                        category,
+                        series,
+                        specs,
+                        ai_summary,
+                        pdf_source,
+                        embedding
+                    FROM products
+                    WHERE {where_clause}
+                )
+                SELECT 
+                    model_name,
+                    category,
+                    series,
+                    specs,
+                    ai_summary,
+                    pdf_source,
+                    embedding <=> $1 AS distance
+                FROM filtered
+                ORDER BY distance
+                LIMIT ${param_idx}
+            """
         
         rows = await db.fetch(query, *params)
         
         results = []
         for row in rows:
             result = self._row_to_result(row)
-            result.similarity_score = float(row['similarity'])
+            result.similarity_score = 1.0 - float(row['distance'])
             results.append(result)
         
         return results
@@ -213,31 +293,11 @@ class HybridRetriever:
         db = await get_db()
         
         # Build WHERE clause
-        where_clauses = []
-        params = []
-        param_idx = 1
-        
-        if 'min_watts' in filters:
-            where_clauses.append(f"watts_int >= ${param_idx}")
-            params.append(filters['min_watts'])
-            param_idx += 1
-        
-        if 'max_watts' in filters:
-            where_clauses.append(f"watts_int <= ${param_idx}")
-            params.append(filters['max_watts'])
-            param_idx += 1
-        
-        if 'voltage_type' in filters:
-            where_clauses.append(f"voltage_type = ${param_idx}")
-            params.append(filters['voltage_type'])
-            param_idx += 1
-        
-        if 'category' in filters:
-            where_clauses.append(f"category = ${param_idx}")
-            params.append(filters['category'])
-            param_idx += 1
+        where_clauses, params = self._filter_clauses(filters, first_param=1)
+        param_idx = len(params) + 1
         
         where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
+        params.append(limit)
         
         query = f"""
             SELECT 
@@ -250,7 +310,7 @@ class HybridRetriever:
             FROM products
             WHERE {where_clause}
             ORDER BY model_name
-            LIMIT {limit}
+            LIMIT ${param_idx}
         """
         
         rows = await db.fetch(query, *params)
@@ -284,7 +344,7 @@ class HybridRetriever:
             model_name,
         )
         
-        if not ref_row or not ref_row['embedding']:
+        if not ref_row or ref_row['embedding'] is None:
             return []
         
         # Find similar products (same category preferred)
@@ -297,13 +357,13 @@ class HybridRetriever:
                 specs,
                 ai_summary,
                 pdf_source,
-                1 - (embedding <=> $1) as similarity
+                embedding <=> $1 AS distance
             FROM products
             WHERE embedding IS NOT NULL
               AND UPPER(model_name) != UPPER($2)
             ORDER BY 
                 CASE WHEN category = $3 THEN 0 ELSE 1 END,
-                embedding <=> $1
+                distance
             LIMIT $4
             """,
             ref_row['embedding'],
@@ -315,7 +375,7 @@ class HybridRetriever:
         results = []
         for row in rows:
             result = self._row_to_result(row)
-            result.similarity_score = float(row['similarity'])
+            result.similarity_score = 1.0 - float(row['distance'])
             results.append(result)
         
         return results
@@ -357,47 +417,60 @@ class HybridRetriever:
         
         return [self._row_to_result(row) for row in rows]
     
-    def _row_to_result(self, row) -> RetrievalResult:
-        """Convert database row to RetrievalResult."""
-        specs = row['specs']
-        if isinstance(specs, str):
-            specs = json.loads(specs)
+    def _shared_specs(self, model_name: str, specs: dict[str, Any]) -> dict[str, Any]:
+        """
+        Return the cached specs dict for model_name if it is unchanged.
         
+        Specs are treated as read-only after retrieval, so results for the
+        same product can alias one dict.
+        """
+        cached = self._specs_cache.get(model_name)
+        if cached is not None and cached == specs:
+            self._specs_cache.move_to_end(model_name)
+            return cached
+        
+        self._specs_cache[model_name] = specs
+        self._specs_cache.move_to_end(model_name)
+        if len(self._specs_cache) > self.SPECS_CACHE_SIZE:
+            self._specs_cache.popitem(last=False)
+        return specs
+    
+    def _row_to_result(self, row) -> RetrievalResult:
+        """Convert database row to RetrievalResult (specs arrive decoded)."""
+        model_name = intern_short(row['model_name'])
         return RetrievalResult(
-            model_name=row['model_name'],
-            category=row.get('category'),
-            series=row.get('series'),
-            specs=specs,
+            model_name=model_name,
+            category=intern_short(row.get('category')),
+            series=intern_short(row.get('series')),
+            specs=self._shared_specs(model_name, row['specs']),
             ai_summary=row.get('ai_summary'),
-            pdf_source=row.get('pdf_source'),
+            pdf_source=intern_short(row.get('pdf_source')),
         )
     
     async def get_stats(self) -> dict:
         """Get retrieval statistics."""
         db = await get_db()
         
-        stats = {}
-        
-        # Total products
-        stats['total_products'] = await db.fetchval(
-            "SELECT COUNT(*) FROM products"
-        )
-        
-        # Products with embeddings
-        stats['with_embeddings'] = await db.fetchval(
-            "SELECT COUNT(*) FROM products WHERE embedding IS NOT NULL"
-        )
-        
-        # Products by category
+        # One round trip (and one snapshot): per-category counts, with the
+        # uncategorized group included so the totals can be summed
         rows = await db.fetch(
             """
-            SELECT category, COUNT(*) as count
+            SELECT
+                category,
+                COUNT(*) AS count,
+                COUNT(embedding) AS with_embeddings
             FROM products
-            WHERE category IS NOT NULL
             GROUP BY category
             ORDER BY count DESC
             """
         )
-        stats['by_category'] = {row['category']: row['count'] for row in rows}
         
-        return stats
+        return {
+            'total_products': sum(row['count'] for row in rows),
+            'with_embeddings': sum(row['with_embeddings'] for row in rows),
+            'by_category': {
+                row['category']: row['count']
+                for row in rows
+                if row['category'] is not None
+            },
+        }
@@ -5,15 +5,61 @@ Uses Ollama LLM to classify queries into DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALC
 
 import logging
 import re
+import time
+from collections import OrderedDict
 from enum import Enum
 from typing import Optional
 
 import httpx
+import orjson
 
 from src.config import settings
+from src.ollama_http import JSON_HEADERS
 
 logger = logging.getLogger(__name__)
 
+# Bose model name patterns, tried in order (first match wins)
+_MODEL_NAME_SOURCES = (
+    r'\b(AM\d+/\d+)\b',          # AM10/60
+    r'\b(DM\d+S?E?)\b',           # DM3SE, DM8SE
+    r'\b(FS\d+S?E?)\b',           # FS2SE
+    r'\b(EM\d+)\b',               # EM90
+    r'\b(IZA\s*\d+-?\w*)\b',      # IZA 250-LZ
+    r'\b(P\d{4}[A-Z]?)\b',        # P4300A
+    r'\b(CC-\d+D?)\b',            # CC-1, CC-2D
+    r'\b(\d{3,4}B[LH])\b',        # 250BL, 1100BH
+)
+_MODEL_NAME_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in _MODEL_NAME_SOURCES)
+
+# All model patterns fused, to reject queries without a model in one scan.
+# Every pattern needs a digit, so digit-free queries skip even that.
+_MODEL_NAME_RE = re.compile("|".join(f"(?:{p})" for p in _MODEL_NAME_SOURCES), re.IGNORECASE)
+_HAS_DIGIT = re.compile(r'\d')
+
+# Filter and calculation parameter patterns
+_MIN_WATTS_RE = re.compile(r'(?:over|above|more than|>)\s*(\d+)\s*W', re.IGNORECASE)
+_MAX_WATTS_RE = re.compile(r'(?:under|below|less than|<)\s*(\d+)\s*W', re.IGNORECASE)
+_SPEAKERS_RE = re.compile(r'(\d+)\s*(?:×|x|speakers?\s*(?:at|@)?)\s*(\d+)\s*W', re.IGNORECASE)
+_TRANSFORMER_RE = re.compile(r'(\d+)\s*W\s*(?:transformer|amp|amplifier)', re.IGNORECASE)
+_IMPEDANCE_RE = re.compile(r'(\d+)\s*(?:Ω|ohm)', re.IGNORECASE)
+
+# Category and series keywords for extract_filters, checked in order as
+# substrings of the lowered query (first hit wins). "speaker" also covers
+# "loudspeaker" and "amp" covers "amplifier".
+_CATEGORY_KEYWORDS = (
+    ('speaker', 'loudspeaker'),
+    ('amp', 'amplifier'),
+    ('controller', 'controller'),
+    ('sub', 'subwoofer'),
+)
+_SERIES_KEYWORDS = (
+    ('designmax', 'DesignMax'),
+    ('freespace', 'FreeSpace'),
+    ('arenamatch', 'ArenaMatch'),
+    ('edgemax', 'EdgeMax'),
+    ('powerspace', 'PowerSpace'),
+)
+
 
 class QueryType(Enum):
     """Types of queries the system can handle."""
@@ -33,14 +79,14 @@ class QueryRouter:
     """
     
     # Rule-based patterns for fast classification
-    DIRECT_LOOKUP_PATTERNS = [
+    DIRECT_LOOKUP_PATTERNS = (
         r"what(?:'s| is) the .* of (\w+[-/]?\w*)",  # "What's the power of AM10/60?"
         r"(?:get|show|tell me) (?:the )?.* (?:for|of) (\w+[-/]?\w*)",
         r"(\w+[-/]\w+) (?:specs|specifications|details)",
         r"specs (?:for|of) (\w+[-/]?\w*)",
-    ]
+    )
     
-    CALCULATION_PATTERNS = [
+    CALCULATION_PATTERNS = (
         r"can I connect",
         r"how many .* can I",
         r"will .* work with",
@@ -50,9 +96,9 @@ class QueryRouter:
         r"(\d+)\s*speakers?\s*(?:at|@)\s*(\d+)\s*W",
         r"transformer",
         r"impedance.*(?:series|parallel)",
-    ]
+    )
     
-    SEMANTIC_SEARCH_PATTERNS = [
+    SEMANTIC_SEARCH_PATTERNS = (
         r"find",
         r"search",
         r"recommend",
@@ -62,7 +108,28 @@ class QueryRouter:
         r"which .* should",
         r"suitable for",
         r"good for",
-    ]
+    )
+    
+    # Each category fused into one alternation, compiled once at import, so
+    # a query is scanned once per category instead of once per pattern.
+    # IGNORECASE stays even though queries are lowered: several patterns
+    # spell the watt unit as "W".
+    _CALCULATION_RE = re.compile("|".join(f"(?:{p})" for p in CALCULATION_PATTERNS), re.IGNORECASE)
+    _DIRECT_LOOKUP_RE = re.compile("|".join(f"(?:{p})" for p in DIRECT_LOOKUP_PATTERNS), re.IGNORECASE)
+    _SEMANTIC_SEARCH_RE = re.compile("|".join(f"(?:{p})" for p in SEMANTIC_SEARCH_PATTERNS), re.IGNORECASE)
+    
+    # Literal substrings at least one of which every pattern in the category
+    # requires. Most queries miss all of them, and a substring scan is far
+    # cheaper than running the regex to find that out.
+    _CALCULATION_ANCHORS = (
+        "connect", "how many", "work with", "calculate", "total",
+        "×", "x", "speaker", "transformer", "impedance",
+    )
+    _DIRECT_LOOKUP_ANCHORS = ("of ", "for ", "spec", "details")
+    _SEMANTIC_SEARCH_ANCHORS = (
+        "find", "search", "recommend", "suggest", "looking for",
+        "best", "which", "suitable for", "good for",
+    )
     
     # LLM classification prompt
     CLASSIFICATION_PROMPT = """You are classifying user queries about Bose professional audio products.
@@ -76,6 +143,10 @@ Query: {query}
 
 Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
 
+    # Classifications are cached per normalized query (LRU with expiry)
+    CLASSIFY_CACHE_SIZE = 4096
+    CLASSIFY_CACHE_TTL = 3600.0
+
     def __init__(
         self,
         base_url: Optional[str] = None,
@@ -94,6 +165,19 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
         self.model = model or settings.ollama_llm_model
         self.use_llm = use_llm
         self._client: Optional[httpx.AsyncClient] = None
+        
+        # Fixed per instance; _llm_classify only adds the prompt
+        self._classify_payload = {
+            "model": self.model,
+            "stream": False,
+            "options": {
+                "temperature": 0.1,  # Very low for consistent classification
+                "num_predict": 10,
+            },
+        }
+        
+        # Normalized query -> (expiry time, LLM classification)
+        self._classify_cache: OrderedDict[str, tuple[float, QueryType]] = OrderedDict()
     
     async def _get_client(self) -> httpx.AsyncClient:
         """Get or create HTTP client."""
@@ -120,23 +204,23 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
         query_lower = query.lower()
         
         # Check for calculation patterns first (most specific)
-        for pattern in self.CALCULATION_PATTERNS:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.CALCULATION
+        if (any(a in query_lower for a in self._CALCULATION_ANCHORS)
+                and self._CALCULATION_RE.search(query_lower)):
+            return QueryType.CALCULATION
         
         # Check for direct lookup (model name in query)
-        for pattern in self.DIRECT_LOOKUP_PATTERNS:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.DIRECT_LOOKUP
+        if (any(a in query_lower for a in self._DIRECT_LOOKUP_ANCHORS)
+                and self._DIRECT_LOOKUP_RE.search(query_lower)):
+            return QueryType.DIRECT_LOOKUP
         
         # Check for semantic search
-        for pattern in self.SEMANTIC_SEARCH_PATTERNS:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                return QueryType.SEMANTIC_SEARCH
+        if (any(a in query_lower for a in self._SEMANTIC_SEARCH_ANCHORS)
+                and self._SEMANTIC_SEARCH_RE.search(query_lower)):
+            return QueryType.SEMANTIC_SEARCH
         
         return None
     
-    async def _llm_classify(self, query: str) -> QueryType:
+    async def _llm_classify(self, query: str) -> Optional[QueryType]:
         """
         Use Ollama LLM for classification when rules are insufficient.
         
@@ -144,7 +228,8 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
             query: User query to classify
             
         Returns:
-            Classified QueryType
+            Classified QueryType, or None if the LLM call failed or its
+            answer could not be parsed
         """
         try:
             client = await self._get_client()
@@ -153,22 +238,15 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
             
             response = await client.post(
                 "/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,  # Very low for consistent classification
-                        "num_predict": 10,
-                    },
-                },
+                content=orjson.dumps({**self._classify_payload, "prompt": prompt}),
+                headers=JSON_HEADERS,
             )
             
             if response.status_code != 200:
                 logger.error(f"LLM classification failed: {response.status_code}")
-                return QueryType.SEMANTIC_SEARCH  # Default fallback
+                return None
             
-            data = response.json()
+            data = orjson.loads(response.content)
             result = data.get('response', '').strip().upper()
             
             # Parse result
@@ -180,17 +258,39 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
                 return QueryType.SEMANTIC_SEARCH
             else:
                 logger.warning(f"Unexpected LLM response: {result}")
-                return QueryType.SEMANTIC_SEARCH
+                return None
                 
         except Exception as e:
             logger.error(f"LLM classification error: {e}")
-            return QueryType.SEMANTIC_SEARCH
+            return None
+    
+    def _cached_classification(self, key: str) -> Optional[QueryType]:
+        """Look up a cached classification, dropping it if expired."""
+        entry = self._classify_cache.get(key)
+        if entry is None:
+            return None
+        expires, query_type = entry
+        if expires <= time.monotonic():
+            del self._classify_cache[key]
+            return None
+        self._classify_cache.move_to_end(key)
+        return query_type
+    
+    def _cache_classification(self, key: str, query_type: QueryType) -> None:
+        """Store a classification, evicting the least recently used."""
+        self._classify_cache[key] = (time.monotonic() + self.CLASSIFY_CACHE_TTL, query_type)
+        self._classify_cache.move_to_end(key)
+        if len(self._classify_cache) > self.CLASSIFY_CACHE_SIZE:
+            self._classify_cache.popitem(last=False)
     
     async def classify(self, query: str) -> QueryType:
         """
         Classify a user query into the appropriate type.
         
         Uses rule-based matching first, falls back to LLM for ambiguous cases.
+        Results are cached per lowercased query, so repeats skip both the
+        regex pass and the LLM; failed LLM calls fall back to SEMANTIC_SEARCH
+        uncached.
         
         Args:
             query: User query to classify
@@ -203,19 +303,31 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
         
         query = query.strip()
         
+        # Whitespace is kept in the key: the rule patterns are sensitive to it
+        key = query.lower()
+        cached = self._cached_classification(key)
+        if cached is not None:
+            logger.debug(f"Cached classification: {query[:50]} -> {cached.value}")
+            return cached
+        
         # Try rule-based classification first (fast)
         rule_result = self._rule_based_classify(query)
         if rule_result is not None:
+            self._cache_classification(key, rule_result)
             logger.debug(f"Rule-based classification: {query[:50]} -> {rule_result.value}")
             return rule_result
         
         # Fall back to LLM if enabled
         if self.use_llm:
             llm_result = await self._llm_classify(query)
+            if llm_result is None:
+                return QueryType.SEMANTIC_SEARCH  # Default fallback
+            self._cache_classification(key, llm_result)
             logger.debug(f"LLM classification: {query[:50]} -> {llm_result.value}")
             return llm_result
         
         # Default to semantic search
+        self._cache_classification(key, QueryType.SEMANTIC_SEARCH)
         return QueryType.SEMANTIC_SEARCH
     
     def extract_model_name(self, query: str) -> Optional[str]:
@@ -228,20 +340,12 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
         Returns:
             Extracted model name or None
         """
-        # Bose model patterns
-        patterns = [
-            r'\b(AM\d+/\d+)\b',          # AM10/60
-            r'\b(DM\d+S?E?)\b',           # DM3SE, DM8SE
-            r'\b(FS\d+S?E?)\b',           # FS2SE
-            r'\b(EM\d+)\b',               # EM90
-            r'\b(IZA\s*\d+-?\w*)\b',      # IZA 250-LZ
-            r'\b(P\d{4}[A-Z]?)\b',        # P4300A
-            r'\b(CC-\d+D?)\b',            # CC-1, CC-2D
-            r'\b(\d{3,4}B[LH])\b',        # 250BL, 1100BH
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, query, re.IGNORECASE)
+        if not _HAS_DIGIT.search(query) or not _MODEL_NAME_RE.search(query):
+            return None
+        
+        # A model is present; the ordered patterns decide which one wins
+        for pattern in _MODEL_NAME_PATTERNS:
+            match = pattern.search(query)
             if match:
                 return match.group(1).upper()
         
@@ -261,11 +365,11 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
         query_lower = query.lower()
         
         # Power filters
-        power_match = re.search(r'(?:over|above|more than|>)\s*(\d+)\s*W', query, re.I)
+        power_match = _MIN_WATTS_RE.search(query)
         if power_match:
             filters['min_watts'] = int(power_match.group(1))
         
-        power_match = re.search(r'(?:under|below|less than|<)\s*(\d+)\s*W', query, re.I)
+        power_match = _MAX_WATTS_RE.search(query)
         if power_match:
             filters['max_watts'] = int(power_match.group(1))
         
@@ -280,24 +384,13 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
             filters['voltage_type'] = 'Low-Z'
         
         # Category
-        if any(kw in query_lower for kw in ['speaker', 'loudspeaker']):
-            filters['category'] = 'loudspeaker'
-        elif any(kw in query_lower for kw in ['amp', 'amplifier']):
-            filters['category'] = 'amplifier'
-        elif 'controller' in query_lower:
-            filters['category'] = 'controller'
-        elif 'sub' in query_lower:
-            filters['category'] = 'subwoofer'
+        for kw, category in _CATEGORY_KEYWORDS:
+            if kw in query_lower:
+                filters['category'] = category
+                break
         
         # Series
-        series_keywords = {
-            'designmax': 'DesignMax',
-            'freespace': 'FreeSpace',
-            'arenamatch': 'ArenaMatch',
-            'edgemax': 'EdgeMax',
-            'powerspace': 'PowerSpace',
-        }
-        for kw, series in series_keywords.items():
+        for kw, series in _SERIES_KEYWORDS:
             if kw in query_lower:
                 filters['series'] = series
                 break
@@ -317,25 +410,19 @@ Respond with ONLY one word: DIRECT_LOOKUP, SEMANTIC_SEARCH, or CALCULATION"""
         params = {}
         
         # Extract speaker wattages: "4 speakers at 30W" or "4x30W"
-        speaker_match = re.search(
-            r'(\d+)\s*(?:×|x|speakers?\s*(?:at|@)?)\s*(\d+)\s*W',
-            query, re.IGNORECASE
-        )
+        speaker_match = _SPEAKERS_RE.search(query)
         if speaker_match:
             count = int(speaker_match.group(1))
             watts = int(speaker_match.group(2))
             params['speakers'] = [watts] * count
         
         # Extract transformer capacity
-        transformer_match = re.search(
-            r'(\d+)\s*W\s*(?:transformer|amp|amplifier)',
-            query, re.IGNORECASE
-        )
+        transformer_match = _TRANSFORMER_RE.search(query)
         if transformer_match:
             params['transformer_watts'] = int(transformer_match.group(1))
         
         # Extract impedances
-        impedance_match = re.findall(r'(\d+)\s*(?:Ω|ohm)', query, re.IGNORECASE)
+        impedance_match = _IMPEDANCE_RE.findall(query)
         if impedance_match:
             params['impedances'] = [float(z) for z in impedance_match]
         
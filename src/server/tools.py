@@ -6,9 +6,11 @@ Defines the tools exposed via Model Context Protocol.
 import logging
 from typing import Any, Optional
 
+from src.rag.embeddings import close_embedding_client
 from src.rag.engine import QueryEngine
 from src.rag.retrieval import RetrievalResult
 from src.logic.calculator import ElectricalCalculator
+from src.ollama_http import close_ollama_client
 
 logger = logging.getLogger(__name__)
 
@@ -166,7 +168,7 @@ class BoseProductTools:
         return {
             "total_impedance": result.total_impedance,
             "connection": result.connection,
-            "speakers": result.speakers,
+            "speakers": list(result.speakers),
             "message": result.message,
         }
     
@@ -211,3 +213,5 @@ class BoseProductTools:
     async def close(self) -> None:
         """Close connections."""
         await self.engine.close()
+        await close_embedding_client()
+        await close_ollama_client()